@@ -0,0 +1,264 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import OperationFailure, PyMongoError
+
+
+logger = logging.getLogger(__name__)
+
+# Every index the application relies on, per collection (user_stats and
+# schema_versions are only read by _id). Bump INDEX_SCHEMA_VERSION whenever
+# this changes: processes only build indexes when the version recorded in the
+# database is older.
+INDEX_SCHEMA_VERSION = 2
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("created_at", ASCENDING)])
+    ],
+    "trips": [
+        # Active trip loading and lookups
+        IndexModel([("status", ASCENDING)]),
+        # History pages (see app.utils.pagination), with and without a status filter
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # Site-wide exports
+        IndexModel([("created_at", ASCENDING)]),
+        # Fleet and area searches
+        IndexModel([("status", ASCENDING), ("last_position", GEOSPHERE)]),
+        # Imported trips are only imported once
+        IndexModel(
+            [("import_key", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"import_key": {"$exists": True}}
+        )
+    ],
+    "trip_points": [
+        IndexModel([("trip_id", ASCENDING), ("bucket", ASCENDING)], unique=True)
+    ],
+    "safety_checks": [
+        # Latest check of a user
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+        # Latest passed check, required to start a trip
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING), ("passed_at", DESCENDING)]),
+        IndexModel([("trip_id", ASCENDING)])
+    ],
+    "emergencies": [
+        IndexModel([("status", ASCENDING)]),
+        IndexModel([("created_at", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("position", GEOSPHERE)])
+    ],
+    "vehicles": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # Plates are registered once
+        IndexModel([("license_plate", ASCENDING)], unique=True)
+    ],
+    "trip_daily_rollups": [
+        # Dashboard reads of a user's days (see app.utils.daily_rollups)
+        IndexModel([("user_id", ASCENDING), ("day", ASCENDING)])
+    ]
+}
+
+# Applied index schema version: {"_id": "indexes", "version", "applied_at"},
+# plus "failed_version", "failed_at", "errors" and "duplicates" while the
+# latest build of a newer version is failing
+SCHEMA_COLLECTION = "schema_versions"
+
+# Duplicate keys listed per unique index that cannot be built
+DUPLICATE_REPORT_LIMIT = 10
+
+# Server error code of a duplicate key
+DUPLICATE_KEY_ERROR = 11000
+
+# Failure records being written by index_build_done callbacks
+_failure_writes: Set[asyncio.Task] = set()
+
+
+def index_key(key) -> Tuple[Tuple[str, object], ...]:
+    """Comparable form of an index key specification"""
+    return tuple((field, direction) for field, direction in (key.items() if hasattr(key, "items") else key))
+
+
+async def applied_version(database: AsyncIOMotorDatabase) -> int:
+    """Index schema version recorded in the database, 0 if none"""
+    doc = await database[SCHEMA_COLLECTION].find_one({"_id": "indexes"})
+    return doc.get("version", 0) if doc else 0
+
+
+async def duplicate_keys(database: AsyncIOMotorDatabase, collection: str) -> List[dict]:
+    """Keys held by several documents, for each unique index of a collection"""
+    duplicates = []
+    for model in INDEXES[collection]:
+        spec = model.document
+        if not spec.get("unique"):
+            continue
+        
+        pipeline = []
+        if "partialFilterExpression" in spec:
+            pipeline.append({"$match": spec["partialFilterExpression"]})
+        pipeline += [
+            {"$group": {
+                "_id": {field: f"${field}" for field, _ in index_key(spec["key"])},
+                "count": {"$sum": 1}
+            }},
+            {"$match": {"count": {"$gt": 1}}},
+            {"$limit": DUPLICATE_REPORT_LIMIT}
+        ]
+        async for group in database[collection].aggregate(pipeline):
+            duplicates.append({"index": spec["name"], "key": group["_id"], "count": group["count"]})
+    return duplicates
+
+
+async def record_index_failure(
+    database: AsyncIOMotorDatabase,
+    errors: Dict[str, str],
+    duplicates: Optional[Dict[str, List[dict]]] = None
+) -> None:
+    """Record a failed build on the version record, keeping the applied version"""
+    try:
+        await database[SCHEMA_COLLECTION].update_one(
+            {"_id": "indexes"},
+            {"$set": {
+                "failed_version": INDEX_SCHEMA_VERSION,
+                "failed_at": datetime.utcnow(),
+                "errors": errors,
+                "duplicates": duplicates or {}
+            }},
+            upsert=True
+        )
+    except PyMongoError as e:
+        logger.error("Failed to record the index build failure: %s", e)
+
+
+def index_build_done(database: AsyncIOMotorDatabase) -> Callable[[asyncio.Task], None]:
+    """Done-callback for a background ensure_indexes task, logging and recording its failure"""
+    def done(task: asyncio.Task) -> None:
+        if task.cancelled() or task.exception() is None:
+            return
+        
+        error = task.exception()
+        logger.error("Index build failed", exc_info=error)
+        write = asyncio.ensure_future(record_index_failure(database, {"build": str(error)}))
+        _failure_writes.add(write)
+        write.add_done_callback(_failure_writes.discard)
+    
+    return done
+
+
+async def ensure_indexes(database: AsyncIOMotorDatabase, force: bool = False) -> bool:
+    """Build the declared indexes unless the current version is already applied
+    
+    Collections are built concurrently, each with a single createIndexes
+    command. The version is only recorded once every collection succeeded,
+    so a failed build is retried by the next process that starts, and the
+    failure is recorded meanwhile. A build that failed on duplicate keys is
+    only retried once the duplicates are gone (or when forced).
+    """
+    record = await database[SCHEMA_COLLECTION].find_one({"_id": "indexes"}) or {}
+    if not force and record.get("version", 0) >= INDEX_SCHEMA_VERSION:
+        return False
+    
+    if not force and record.get("failed_version") == INDEX_SCHEMA_VERSION and record.get("duplicates"):
+        duplicates = {}
+        for name in record["duplicates"]:
+            found = await duplicate_keys(database, name)
+            if found:
+                duplicates[name] = found
+        if duplicates:
+            log_duplicates(duplicates)
+            await record_index_failure(database, record.get("errors", {}), duplicates)
+            return False
+    
+    collections = list(INDEXES)
+    results = await asyncio.gather(
+        *(database[name].create_indexes(INDEXES[name]) for name in collections),
+        return_exceptions=True
+    )
+    
+    errors = {}
+    duplicates = {}
+    for name, result in zip(collections, results):
+        if isinstance(result, Exception):
+            errors[name] = str(result)
+            logger.error("Failed to build indexes on %s: %s", name, result)
+            if getattr(result, "code", None) == DUPLICATE_KEY_ERROR:
+                duplicates[name] = await duplicate_keys(database, name)
+    if errors:
+        log_duplicates(duplicates)
+        await record_index_failure(database, errors, duplicates)
+        return False
+    
+    await database[SCHEMA_COLLECTION].update_one(
+        {"_id": "indexes"},
+        {
+            "$set": {"version": INDEX_SCHEMA_VERSION, "applied_at": datetime.utcnow()},
+            "$unset": {"failed_version": "", "failed_at": "", "errors": "", "duplicates": ""}
+        },
+        upsert=True
+    )
+    logger.info("Index schema version %d applied", INDEX_SCHEMA_VERSION)
+    return True
+
+
+def log_duplicates(duplicates: Dict[str, List[dict]]) -> None:
+    """Log the duplicate keys preventing unique indexes from being built"""
+    for collection, found in duplicates.items():
+        for duplicate in found:
+            logger.error(
+                "Unique index %s.%s cannot be built: %d documents share %s",
+                collection, duplicate["index"], duplicate["count"], duplicate["key"]
+            )
+
+
+async def index_usage(database: AsyncIOMotorDatabase, collection: str) -> Dict[str, int]:
+    """Operations served by each index since the server started ($indexStats)"""
+    try:
+        cursor = database[collection].aggregate([{"$indexStats": {}}])
+        return {stat["name"]: stat["accesses"]["ops"] async for stat in cursor}
+    except OperationFailure:
+        return {}
+
+
+async def index_report(database: AsyncIOMotorDatabase) -> Dict[str, dict]:
+    """Declared indexes that are missing (with the duplicate keys blocking unique ones), and existing ones undeclared or unused"""
+    report = {}
+    for collection, models in INDEXES.items():
+        existing = await database[collection].index_information()
+        usage = await index_usage(database, collection)
+        
+        existing_keys = {index_key(info["key"]): name for name, info in existing.items()}
+        declared_keys = {index_key(model.document["key"]) for model in models}
+        
+        missing = [
+            model.document for model in models
+            if index_key(model.document["key"]) not in existing_keys
+        ]
+        duplicates = []
+        if any(spec.get("unique") for spec in missing):
+            missing_names = {spec["name"] for spec in missing}
+            duplicates = [
+                duplicate for duplicate in await duplicate_keys(database, collection)
+                if duplicate["index"] in missing_names
+            ]
+        
+        report[collection] = {
+            "missing": [spec["name"] for spec in missing],
+            "duplicates": duplicates,
+            "undeclared": [
+                name for key, name in existing_keys.items()
+                if key not in declared_keys and name != "_id_"
+            ],
+            # Counters restart with the server, so this is only meaningful
+            # on a server that has been up for a while
+            "unused": [
+                name for name, ops in usage.items()
+                if ops == 0 and name != "_id_"
+            ]
+        }
+    return report
@@ -15,9 +15,72 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 24 hours
     
+    # Stateless token mode: short-lived access tokens carry the profile claims
+    # routers need, so identity-only endpoints skip the users lookup; clients
+    # renew them through /auth/refresh with a long-lived refresh token
+    STATELESS_TOKENS: bool = False
+    STATELESS_ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    PASSWORD_HASH_WORKERS: int = 2  # Concurrent bcrypt operations
+    
+    # Authenticated user cache (per process; writes in other processes are
+    # only picked up once the entry expires)
+    USER_CACHE_TTL_SECONDS: int = 60
+    USER_CACHE_MAX_SIZE: int = 10000
+    
+    # Conditional-GET response cache for dashboard and history endpoints
+    # (per process, like the user cache)
+    RESPONSE_CACHE_TTL_SECONDS: int = 60
+    RESPONSE_CACHE_MAX_SIZE: int = 10000
+    
+    # Trip tracking settings
+    LOCATION_BATCH_MAX_POINTS: int = 1000
+    LOCATION_MAX_CLOCK_SKEW_SECONDS: int = 120  # How far ahead of server time a location may be stamped
+    ROUTE_BUCKET_SIZE: int = 200  # Route points stored per trip_points document
+    ROUTE_PAGE_MAX_POINTS: int = 5000
+    ROUTE_STORAGE_FORMAT: str = "points"  # "encoded" compacts buckets of completed trips
+    ROUTE_SIMPLIFY_TOLERANCE_M: float = 5.0  # Simplified route cached at trip completion
+    ROUTE_PREVIEW_MAX_POINTS: int = 500  # ...capped to this many points, as it is kept in the trip document
+    TRIP_STREAM_ACK_POINTS: int = 6  # Streamed points acknowledged together (each frame is appended on arrival)
+    TRIP_STREAM_ACK_SECONDS: float = 60  # Longest a streamed point waits for its ack
+    
+    # Route point write-behind buffer: "flush" acknowledges location updates
+    # once their points are written, "enqueue" as soon as they are queued.
+    # Enqueue is faster, but points still queued are lost if the process
+    # dies, and points dropped after failed writes are not taken back out of
+    # the trip's point_count and distance_km: its counters can run ahead of
+    # the stored route. Flush mode undoes the append and answers 503 instead.
+    LOCATION_WRITE_DURABILITY: str = "flush"
+    LOCATION_FLUSH_INTERVAL_MS: int = 50
+    LOCATION_FLUSH_MAX_POINTS: int = 500
+    LOCATION_FLUSH_MAX_ATTEMPTS: int = 3  # Failed writes are retried before their points are dropped
+    LOCATION_FLUSH_RETRY_MS: int = 500
+    
+    # Fleet live map
+    FLEET_GRID_CELL_DEGREES: float = 0.05  # About 5.5 km of latitude per grid cell
+    FLEET_MAX_POSITIONS: int = 2000  # Beyond this many drivers in view, return clusters
+    FLEET_CLUSTER_DIVISIONS: int = 16  # Clusters per viewport side
+    
+    # Dispatcher event stream (per process)
+    EVENT_QUEUE_SIZE: int = 100  # Undelivered events before a subscriber is dropped
+    EVENT_REPLAY_SIZE: int = 256  # Recent events replayed to reconnecting clients
+    EVENT_HEARTBEAT_SECONDS: int = 15
+    
+    # History listings are paged by cursor (see app.utils.pagination)
+    PAGE_MAX_SIZE: int = 100
+    
+    # History exports are streamed in chunks of this many rows
+    EXPORT_CHUNK_ROWS: int = 500
+    
+    # Historical trip imports (GPX/CSV)
+    IMPORT_WORKERS: int = 4  # Parser processes
+    IMPORT_BATCH_TRIPS: int = 500  # Trips written per bulk insert
+    IMPORT_MAX_FILE_BYTES: int = 50 * 1024 * 1024
+    
     # MongoDB settings
     MONGODB_URL: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
     MONGODB_DB_NAME: str = os.getenv("MONGODB_DB_NAME", "initinerego")
+    INDEX_BUILD_ON_STARTUP: bool = True  # See app.config.indexes
     
     # CORS settings
     CORS_ORIGINS: list = [
@@ -1,11 +1,20 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 from app.config.settings import settings
 from app.config.database import db
-from app.routers import auth, users, vehicles, trips, safety_checks, emergencies, dashboard
+from app.config.indexes import ensure_indexes, index_build_done
+from app.routers import auth, users, vehicles, trips, safety_checks, emergencies, dashboard, fleet
+from app.routers.auth import user_cache
+from app.utils.auth_utils import password_hasher
+from app.utils.response_cache import response_cache
+from app.utils.location_buffer import location_buffer
+from app.utils.active_trips import active_trips
+from app.utils.trip_import import shutdown_parse_pool
+from app.utils.pubsub import emergency_events
 
 
 # Configure logging
@@ -23,13 +32,28 @@ async def lifespan(app: FastAPI):
     logger.info("Starting InItinereGo API...")
     await db.connect()
     logger.info("Connected to MongoDB")
+    await active_trips.load()
+    logger.info(f"Loaded {active_trips.stats()['size']} active trips")
+    
+    # Index builds run in the background (and only when the index schema
+    # version changed): requests are served while MongoDB builds them
+    index_build = None
+    if settings.INDEX_BUILD_ON_STARTUP:
+        index_build = asyncio.create_task(ensure_indexes(db.get_db()))
+        index_build.add_done_callback(index_build_done(db.get_db()))
     
     yield
     
     # Shutdown
     logger.info("Shutting down InItinereGo API...")
+    if index_build is not None and not index_build.done():
+        # MongoDB carries on with builds already started
+        index_build.cancel()
+    await location_buffer.close()
     await db.disconnect()
     logger.info("Disconnected from MongoDB")
+    password_hasher.shutdown()
+    shutdown_parse_pool()
 
 
 # Create FastAPI application
@@ -50,6 +74,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Access-Token", "X-Refresh-Token"],
 )
 
 
@@ -61,6 +86,7 @@ app.include_router(trips.router, prefix=settings.API_V1_PREFIX)
 app.include_router(safety_checks.router, prefix=settings.API_V1_PREFIX)
 app.include_router(emergencies.router, prefix=settings.API_V1_PREFIX)
 app.include_router(dashboard.router, prefix=settings.API_V1_PREFIX)
+app.include_router(fleet.router, prefix=settings.API_V1_PREFIX)
 
 
 # Health check endpoint
@@ -74,6 +100,19 @@ async def health_check():
     }
 
 
+@app.get("/metrics")
+async def metrics():
+    """In-process cache and queue metrics"""
+    return {
+        "user_cache": user_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "response_cache": response_cache.stats(),
+        "location_buffer": location_buffer.stats(),
+        "active_trips": active_trips.stats(),
+        "emergency_events": emergency_events.stats()
+    }
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
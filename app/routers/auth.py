@@ -1,20 +1,28 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from fastapi.security import OAuth2PasswordBearer
 from bson import ObjectId
 from app.config.database import db
+from app.config.settings import settings
+from app.utils.cache import TTLCache
 from app.utils.auth_utils import (
-    verify_password, 
-    get_password_hash, 
+    password_hasher,
     create_user_token,
-    decode_access_token
+    create_profile_token,
+    create_refresh_token,
+    decode_access_token,
+    decode_refresh_token
 )
 from app.schemas.pydantic_models import (
     UserCreate, 
     UserResponse, 
+    UserIdentity,
+    UserRole,
     Token,
     TokenData,
-    LoginRequest
+    LoginRequest,
+    RefreshRequest
 )
 
 
@@ -24,30 +32,119 @@ router = APIRouter(
 )
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login", auto_error=False)
 
+# Authenticated users by id, so most requests skip the users lookup.
+# Write paths that change a user must call user_cache.invalidate(user_id).
+user_cache = TTLCache(settings.USER_CACHE_MAX_SIZE, settings.USER_CACHE_TTL_SECONDS)
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserResponse:
-    """Get the current authenticated user"""
-    credentials_exception = HTTPException(
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def issue_tokens(user_doc: dict, user: UserResponse) -> Token:
+    """Issue the tokens for a user in the configured token mode"""
+    if not settings.STATELESS_TOKENS:
+        access_token = create_user_token(user_id=user.id, email=user.email)
+        return Token(access_token=access_token, user=user)
     
-    token_data = decode_access_token(token)
-    if token_data is None:
-        raise credentials_exception
+    return Token(
+        access_token=create_profile_token(user_doc),
+        refresh_token=create_refresh_token(user.id, user_doc.get("profile_version", 0)),
+        user=user
+    )
+
+
+# Tokens re-issued after a profile change, which revokes the previous ones
+ACCESS_TOKEN_HEADER = "X-Access-Token"
+REFRESH_TOKEN_HEADER = "X-Refresh-Token"
+
+
+def set_reissued_tokens(response: Response, user_doc: dict, user: UserResponse) -> None:
+    """Send fresh stateless tokens after a profile_version bump"""
+    if not settings.STATELESS_TOKENS:
+        return
+    
+    tokens = issue_tokens(user_doc, user)
+    response.headers[ACCESS_TOKEN_HEADER] = tokens.access_token
+    response.headers[REFRESH_TOKEN_HEADER] = tokens.refresh_token
+
+
+async def load_user(user_id: str) -> Optional[UserResponse]:
+    """Load a user through the user cache"""
+    cached_user = user_cache.get(user_id)
+    if cached_user is not None:
+        return cached_user
     
     # Get user from database
     users_collection = db.get_collection("users")
-    user_doc = await users_collection.find_one({"_id": ObjectId(token_data.user_id)})
+    user_doc = await users_collection.find_one({"_id": ObjectId(user_id)})
     
     if user_doc is None:
-        raise credentials_exception
+        return None
     
     # Convert ObjectId to string
     user_doc["id"] = str(user_doc.pop("_id"))
-    return UserResponse(**user_doc)
+    user = UserResponse(**user_doc)
+    user_cache.set(user.id, user)
+    return user
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserResponse:
+    """Get the current authenticated user"""
+    token_data = decode_access_token(token)
+    if token_data is None:
+        raise credentials_exception()
+    
+    user = await load_user(token_data.user_id)
+    if user is None:
+        raise credentials_exception()
+    
+    return user
+
+
+async def get_current_identity(token: str = Depends(oauth2_scheme)) -> UserIdentity:
+    """Get the current user's identity, from token claims when they carry it"""
+    token_data = decode_access_token(token)
+    if token_data is None:
+        raise credentials_exception()
+    
+    # Profile-carrying tokens are trusted until they expire: no lookup
+    if settings.STATELESS_TOKENS and token_data.profile_version is not None:
+        return UserIdentity(
+            id=token_data.user_id,
+            email=token_data.email,
+            full_name=token_data.full_name,
+            vehicle_preference=token_data.vehicle_preference
+        )
+    
+    user = await load_user(token_data.user_id)
+    if user is None:
+        raise credentials_exception()
+    
+    return UserIdentity(
+        id=user.id,
+        email=user.email,
+        full_name=user.full_name,
+        vehicle_preference=user.vehicle_preference
+    )
+
+
+async def require_dispatcher(
+    current_user: UserResponse = Depends(get_current_user)
+) -> UserResponse:
+    """Get the current user, who must be a dispatcher"""
+    if current_user.role != UserRole.DISPATCHER:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Dispatcher role required"
+        )
+    return current_user
 
 
 @router.post("/register", response_model=Token, status_code=status.HTTP_201_CREATED)
@@ -64,7 +161,7 @@ async def register(user_data: UserCreate):
         )
     
     # Hash password
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
     
     # Create user document
     user_doc = {
@@ -75,6 +172,8 @@ async def register(user_data: UserCreate):
         "emergency_contact": user_data.emergency_contact,
         "emergency_phone": user_data.emergency_phone,
         "vehicle_preference": None,
+        "role": UserRole.DRIVER.value,
+        "profile_version": 0,
         "created_at": datetime.utcnow(),
         "updated_at": None
     }
@@ -83,16 +182,13 @@ async def register(user_data: UserCreate):
     result = await users_collection.insert_one(user_doc)
     user_id = str(result.inserted_id)
     
-    # Create token
-    access_token = create_user_token(user_id=user_id, email=user_data.email)
-    
     # Return user response
     user_doc["id"] = user_id
     user_doc.pop("_id")
     user_doc.pop("hashed_password")
     user_response = UserResponse(**user_doc)
     
-    return Token(access_token=access_token, user=user_response)
+    return issue_tokens(user_doc, user_response)
 
 
 @router.post("/login", response_model=Token)
@@ -113,24 +209,19 @@ async def login(login_data: LoginRequest):
     
     # Verify password
     hashed_password = user_doc.get("hashed_password", "")
-    if not verify_password(password, hashed_password):
+    if not await password_hasher.verify(password, hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Create token
-    user_id = str(user_doc.pop("_id"))
-    access_token = create_user_token(user_id=user_id, email=user_doc["email"])
-    
     # Prepare response
-    user_doc["id"] = user_id
-    user_doc.pop("_id")
+    user_doc["id"] = str(user_doc.pop("_id"))
     user_doc.pop("hashed_password")
     user_response = UserResponse(**user_doc)
     
-    return Token(access_token=access_token, user=user_response)
+    return issue_tokens(user_doc, user_response)
 
 
 @router.get("/me", response_model=UserResponse)
@@ -140,10 +231,39 @@ async def get_me(current_user: UserResponse = Depends(get_current_user)):
 
 
 @router.post("/refresh", response_model=Token)
-async def refresh_token(current_user: UserResponse = Depends(get_current_user)):
-    """Refresh access token"""
-    access_token = create_user_token(
-        user_id=current_user.id, 
-        email=current_user.email
-    )
-    return Token(access_token=access_token, user=current_user)
+async def refresh_token(
+    refresh_data: Optional[RefreshRequest] = None,
+    token: Optional[str] = Depends(optional_oauth2_scheme)
+):
+    """Refresh access token
+    
+    With stateless tokens a refresh token is required, and it is only valid
+    for the profile version it was issued for. Otherwise a still-valid
+    access token is renewed.
+    """
+    if settings.STATELESS_TOKENS:
+        token_data = decode_refresh_token(refresh_data.refresh_token) if refresh_data else None
+    else:
+        token_data = decode_access_token(token) if token else None
+    
+    if token_data is None:
+        raise credentials_exception()
+    
+    # Always read the stored profile so re-issued claims reflect any change
+    # (profile_version bump) since the previous token
+    users_collection = db.get_collection("users")
+    user_doc = await users_collection.find_one({"_id": ObjectId(token_data.user_id)})
+    
+    if user_doc is None:
+        raise credentials_exception()
+    
+    # A profile change revokes the refresh tokens issued before it
+    if settings.STATELESS_TOKENS and token_data.profile_version != user_doc.get("profile_version", 0):
+        raise credentials_exception()
+    
+    user_doc["id"] = str(user_doc.pop("_id"))
+    user_doc.pop("hashed_password", None)
+    user_response = UserResponse(**user_doc)
+    user_cache.set(user_response.id, user_response)
+    
+    return issue_tokens(user_doc, user_response)
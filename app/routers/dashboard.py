@@ -1,14 +1,22 @@
-from datetime import datetime, timedelta
-from typing import Optional
-from fastapi import APIRouter, Depends
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Optional, Tuple
+from zoneinfo import ZoneInfo
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from app.config.database import db
-from app.routers.auth import get_current_user
-from app.routers.trips import check_active_trip
+from app.routers.auth import get_current_identity
+from app.utils.response_cache import response_cache
+from app.utils.user_stats import STAT_FIELDS, get_user_stats
+from app.utils.daily_rollups import (
+    ROLLUP_FIELDS,
+    daily_totals,
+    empty_totals,
+    get_time_zone
+)
 from app.schemas.pydantic_models import (
     DashboardResponse,
     DashboardStats,
-    RecentTripItem,
-    TripStatus
+    RecentTripItem
 )
 
 
@@ -17,58 +25,33 @@ router = APIRouter(
     tags=["Dashboard"]
 )
 
+# Longest date range served from daily rollups
+MAX_RANGE_DAYS = 731
 
-@router.get("/", response_model=DashboardResponse)
-async def get_dashboard(
-    current_user = Depends(get_current_user)
-):
-    """Get user dashboard with statistics"""
-    users_collection = db.get_collection("users")
+# Indexed by date.weekday() (Monday = 0)
+DAY_NAMES = ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"]
+
+
+async def build_dashboard(user_id: str) -> DashboardResponse:
+    """Build a user's dashboard from their stats document and recent trips"""
     trips_collection = db.get_collection("trips")
-    emergencies_collection = db.get_collection("emergencies")
-    safety_checks_collection = db.get_collection("safety_checks")
     
-    # Get user info
-    user_doc = await users_collection.find_one({"_id": current_user.id})
-    
-    # Calculate statistics
-    total_trips = await trips_collection.count_documents({"user_id": current_user.id})
-    completed_trips = await trips_collection.count_documents({
-        "user_id": current_user.id,
-        "status": TripStatus.COMPLETED.value
-    })
-    active_trips = await trips_collection.count_documents({
-        "user_id": current_user.id,
-        "status": TripStatus.IN_PROGRESS.value
-    })
-    emergencies_count = await emergencies_collection.count_documents({
-        "user_id": current_user.id
-    })
-    safety_checks_passed = await safety_checks_collection.count_documents({
-        "user_id": current_user.id,
-        "status": "passed"
-    })
-    
-    # Calculate total distance and duration
-    trip_stats = await trips_collection.aggregate([
-        {"$match": {"user_id": current_user.id}},
-        {"$group": {
-            "_id": None,
-            "total_distance": {"$sum": "$distance_km"},
-            "total_duration": {"$sum": "$duration_minutes"}
-        }}
-    ]).to_list(length=1)
-    
-    total_distance = trip_stats[0]["total_distance"] if trip_stats else 0
-    total_duration = trip_stats[0]["total_duration"] if trip_stats else 0
-    
-    # Get recent trips
-    recent_trips_cursor = trips_collection.find(
-        {"user_id": current_user.id},
-        sort=[("created_at", -1)],
-        limit=5
+    # Maintained stats document and recent trips, fetched concurrently
+    stats_doc, recent_trips = await asyncio.gather(
+        get_user_stats(user_id),
+        trips_collection.find(
+            {"user_id": user_id},
+            projection={
+                "vehicle_type": 1,
+                "status": 1,
+                "started_at": 1,
+                "completed_at": 1,
+                "distance_km": 1
+            },
+            sort=[("created_at", -1)],
+            limit=5
+        ).to_list(length=5)
     )
-    recent_trips = await recent_trips_cursor.to_list(length=5)
     
     recent_trips_list = []
     for trip in recent_trips:
@@ -82,126 +65,140 @@ async def get_dashboard(
         }
         recent_trips_list.append(RecentTripItem(**trip_item))
     
-    # Check for active trip
-    has_active = await check_active_trip(current_user.id)
-    
     # Build response
-    stats = DashboardStats(
-        total_trips=total_trips,
-        completed_trips=completed_trips,
-        active_trips=active_trips,
-        total_emergencies=emergencies_count,
-        safety_checks_passed=safety_checks_passed,
-        total_distance_km=round(total_distance, 2),
-        total_duration_minutes=total_duration
-    )
+    stats = DashboardStats(**{field: stats_doc.get(field, 0) for field in STAT_FIELDS})
+    stats.total_distance_km = round(stats.total_distance_km, 2)
     
     return DashboardResponse(
         stats=stats,
         recent_trips=recent_trips_list,
-        has_active_trip=has_active
+        has_active_trip=stats.active_trips > 0
     )
 
 
+@router.get("/", response_model=DashboardResponse)
+async def get_dashboard(
+    request: Request,
+    current_user = Depends(get_current_identity)
+):
+    """Get user dashboard with statistics"""
+    return await response_cache.respond(
+        request, current_user.id, lambda: build_dashboard(current_user.id)
+    )
+
+
+def resolve_range(
+    start: Optional[date],
+    end: Optional[date],
+    tz_name: str,
+    default_start
+) -> Tuple[date, date, ZoneInfo]:
+    """Validate a local date range, filling defaults relative to today in tz"""
+    try:
+        tz = get_time_zone(tz_name)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    end = end or datetime.now(tz).date()
+    start = start or default_start(end)
+    
+    if start > end or (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"start must not be after end and the range must be under {MAX_RANGE_DAYS} days"
+        )
+    return start, end, tz
+
+
+def summarize(totals: dict) -> dict:
+    """Summary statistics for a set of rollup totals"""
+    completion_rate = (totals["completed"] / totals["trips"] * 100) if totals["trips"] > 0 else 0
+    return {
+        "total_trips": totals["trips"],
+        "completed_trips": totals["completed"],
+        "total_distance": round(totals["distance_km"], 2),
+        "total_duration": totals["duration_minutes"],
+        "emergencies": totals["emergencies"],
+        "completion_rate": round(completion_rate, 1)
+    }
+
+
 @router.get("/weekly-stats")
 async def get_weekly_stats(
-    current_user = Depends(get_current_user)
+    request: Request,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    tz: str = "UTC",
+    current_user = Depends(get_current_identity)
 ):
-    """Get weekly statistics"""
-    trips_collection = db.get_collection("trips")
-    
-    # Calculate date range (last 7 days)
-    today = datetime.utcnow()
-    week_ago = today - timedelta(days=7)
-    
-    # Aggregate weekly data
-    weekly_data = await trips_collection.aggregate([
-        {
-            "$match": {
-                "user_id": current_user.id,
-                "started_at": {"$gte": week_ago}
-            }
-        },
-        {
-            "$group": {
-                "_id": {"$dayOfWeek": "$started_at"},
-                "trips": {"$sum": 1},
-                "distance": {"$sum": "$distance_km"},
-                "duration": {"$sum": "$duration_minutes"}
+    """Get daily statistics, for the last 7 days by default"""
+    start, end, zone = resolve_range(start, end, tz, lambda end: end - timedelta(days=6))
+    
+    async def build():
+        days = await daily_totals(current_user.id, start, end, zone)
+        return [
+            {
+                "date": day.isoformat(),
+                "day": DAY_NAMES[day.weekday()],
+                "trips": totals["trips"],
+                "distance_km": round(totals["distance_km"], 2),
+                "duration_minutes": totals["duration_minutes"]
             }
-        },
-        {"$sort": {"_id": 1}}
-    ]).to_list(length=7)
+            for day, totals in days.items()
+        ]
     
-    # Format response (day 1 = Sunday)
-    days = ["Dom", "Lun", "Mar", "Mié", "Jue", "Vie", "Sáb"]
-    result = []
-    
-    for i in range(1, 8):
-        day_data = next((d for d in weekly_data if d["_id"] == i), None)
-        result.append({
-            "day": days[i-1],
-            "trips": day_data["trips"] if day_data else 0,
-            "distance_km": round(day_data["distance"], 2) if day_data else 0,
-            "duration_minutes": day_data["duration"] if day_data else 0
-        })
-    
-    return result
+    return await response_cache.respond(request, current_user.id, build)
 
 
 @router.get("/monthly-summary")
 async def get_monthly_summary(
-    current_user = Depends(get_current_user)
+    request: Request,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    tz: str = "UTC",
+    current_user = Depends(get_current_identity)
 ):
-    """Get monthly summary statistics"""
-    trips_collection = db.get_collection("trips")
-    
-    # Calculate date range (current month)
-    today = datetime.utcnow()
-    month_start = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    # Aggregate monthly data
-    monthly_data = await trips_collection.aggregate([
-        {
-            "$match": {
-                "user_id": current_user.id,
-                "started_at": {"$gte": month_start}
-            }
-        },
-        {
-            "$group": {
-                "_id": None,
-                "total_trips": {"$sum": 1},
-                "completed_trips": {
-                    "$sum": {"$cond": [{"$eq": ["$status", "completed"]}, 1, 0]}
-                },
-                "total_distance": {"$sum": "$distance_km"},
-                "total_duration": {"$sum": "$duration_minutes"},
-                "emergencies": {
-                    "$sum": {"$cond": [{"$eq": ["$status", "emergency"]}, 1, 0]}
-                }
-            }
-        }
-    ]).to_list(length=1)
-    
-    if not monthly_data:
-        return {
-            "total_trips": 0,
-            "completed_trips": 0,
-            "total_distance": 0,
-            "total_duration": 0,
-            "emergencies": 0,
-            "completion_rate": 0
-        }
-    
-    data = monthly_data[0]
-    completion_rate = (data["completed_trips"] / data["total_trips"] * 100) if data["total_trips"] > 0 else 0
-    
-    return {
-        "total_trips": data["total_trips"],
-        "completed_trips": data["completed_trips"],
-        "total_distance": round(data["total_distance"], 2),
-        "total_duration": data["total_duration"],
-        "emergencies": data["emergencies"],
-        "completion_rate": round(completion_rate, 1)
-    }
+    """Get summary statistics, for the current month by default"""
+    start, end, zone = resolve_range(start, end, tz, lambda end: end.replace(day=1))
+    
+    async def build():
+        days = await daily_totals(current_user.id, start, end, zone)
+        totals = empty_totals()
+        for day_totals in days.values():
+            for field in ROLLUP_FIELDS:
+                totals[field] += day_totals[field]
+        return summarize(totals)
+    
+    return await response_cache.respond(request, current_user.id, build)
+
+
+@router.get("/monthly-trends")
+async def get_monthly_trends(
+    request: Request,
+    months: int = 12,
+    tz: str = "UTC",
+    current_user = Depends(get_current_identity)
+):
+    """Get summary statistics per month for the last months, current one included"""
+    if not 1 <= months <= 24:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="months must be between 1 and 24"
+        )
+    
+    def first_month_day(end: date) -> date:
+        index = end.year * 12 + end.month - 1 - (months - 1)
+        return date(index // 12, index % 12 + 1, 1)
+    
+    start, end, zone = resolve_range(None, None, tz, first_month_day)
+    
+    async def build():
+        days = await daily_totals(current_user.id, start, end, zone)
+        by_month = {}
+        for day, day_totals in days.items():
+            totals = by_month.setdefault(day.strftime("%Y-%m"), empty_totals())
+            for field in ROLLUP_FIELDS:
+                totals[field] += day_totals[field]
+        return [{"month": month, **summarize(totals)} for month, totals in by_month.items()]
+    
+    return await response_cache.respond(request, current_user.id, build)
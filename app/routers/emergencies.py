@@ -1,16 +1,35 @@
-from datetime import datetime
-from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import json
+from datetime import date, datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
 from app.config.database import db
-from app.routers.auth import get_current_user
+from app.config.settings import settings
+from app.routers.auth import get_current_identity, get_current_user, require_dispatcher
 from app.routers.trips import get_active_trip
+from app.utils.user_stats import increment_user_stats, finished_trip_deltas
+from app.utils.daily_rollups import increment_rollup, emergency_rollup_deltas
+from app.utils.response_cache import response_cache
+from app.utils.active_trips import active_trips
+from app.utils.geo import geo_point, bbox_polygon, ring_polygon, valid_coordinate
+from app.utils.pubsub import emergency_events
+from app.utils.pagination import PAGE_SORT, after_cursor, next_page_headers
+from app.utils.exports import EXPORT_SORT, created_range, export_owner_query, export_response
 from app.schemas.pydantic_models import (
     EmergencyCreate, 
     EmergencyResponse,
+    EmergencyPolygonQuery,
     EmergencyUpdate,
     EmergencyStatus,
-    LocationPoint
+    LocationPoint,
+    TripStatus,
+    ExportFormat,
+    UserResponse
 )
 
 
@@ -26,16 +45,70 @@ EMERGENCY_CONTACTS = {
     "firefighters": {"name": "Bomberos", "phone": "119"}
 }
 
+# Limits for dispatcher area searches
+MAX_SEARCH_RADIUS_KM = 100
+MAX_SEARCH_RESULTS = 500
+
+
+def check_search_limit(limit: int) -> None:
+    """Validate the result limit of an area search"""
+    if not 0 < limit <= MAX_SEARCH_RESULTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"limit must be between 1 and {MAX_SEARCH_RESULTS}"
+        )
+
+
+async def find_emergencies_within(
+    geometry: dict,
+    statuses: List[EmergencyStatus],
+    limit: int
+) -> List[EmergencyResponse]:
+    """Get the most recent emergencies inside a GeoJSON polygon"""
+    emergencies_collection = db.get_collection("emergencies")
+    emergencies = await emergencies_collection.find(
+        {
+            "status": {"$in": [s.value for s in statuses]},
+            "position": {"$geoWithin": {"$geometry": geometry}}
+        },
+        sort=[("created_at", -1)],
+        limit=limit
+    ).to_list(length=limit)
+    
+    result = []
+    for emergency in emergencies:
+        emergency["id"] = str(emergency.pop("_id"))
+        result.append(EmergencyResponse(**emergency))
+    return result
+
+
+def sse_message(event: dict) -> str:
+    """Format a published event as a server-sent events message"""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+def publish_emergency(event_type: str, emergency_doc: dict) -> None:
+    """Push an emergency event to subscribed dispatchers"""
+    emergency = EmergencyResponse(**emergency_doc)
+    emergency_events.publish(event_type, jsonable_encoder(emergency))
+
 
 @router.post("/", response_model=EmergencyResponse, status_code=status.HTTP_201_CREATED)
 async def create_emergency(
     emergency_data: EmergencyCreate,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_identity)
 ):
     """Create a new emergency alert"""
+    if not valid_coordinate(emergency_data.latitude, emergency_data.longitude):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid coordinates"
+        )
+    
     emergencies_collection = db.get_collection("emergencies")
     
-    # Get active trip if exists
+    # Get active trip if exists (from the active trip registry, no query
+    # unless this process has not seen the trip)
     active_trip = await get_active_trip(current_user.id)
     trip_id = str(active_trip["_id"]) if active_trip else None
     
@@ -53,6 +126,7 @@ async def create_emergency(
         "emergency_type": emergency_data.emergency_type,
         "description": emergency_data.description,
         "location": location.dict(),
+        "position": geo_point(location.latitude, location.longitude),
         "status": EmergencyStatus.ACTIVE.value,
         "resolved_at": None,
         "resolution_notes": None,
@@ -61,17 +135,32 @@ async def create_emergency(
     
     result = await emergencies_collection.insert_one(emergency_doc)
     emergency_id = str(result.inserted_id)
+    emergency_doc["id"] = emergency_id
+    publish_emergency("emergency.created", emergency_doc)
     
     # Update active trip to emergency status if exists
+    stats_deltas = {"total_emergencies": 1}
     if active_trip:
         trips_collection = db.get_collection("trips")
-        await trips_collection.update_one(
-            {"_id": active_trip["_id"]},
-            {"$set": {"status": "emergency"}}
+        previous = await trips_collection.find_one_and_update(
+            {"_id": active_trip["_id"], "status": TripStatus.IN_PROGRESS.value},
+            {"$set": {"status": TripStatus.EMERGENCY.value}},
+            projection={"status": 1, "distance_km": 1, "duration_minutes": 1, "started_at": 1},
+            return_document=ReturnDocument.BEFORE
         )
+        active_trips.discard(current_user.id, trip_id)
+        if previous is not None:
+            stats_deltas.update(finished_trip_deltas(previous))
+            await increment_rollup(
+                current_user.id,
+                previous.get("started_at"),
+                **emergency_rollup_deltas(previous)
+            )
+    
+    await increment_user_stats(current_user.id, **stats_deltas)
+    response_cache.bump(current_user.id)
     
     # Return response
-    emergency_doc["id"] = emergency_id
     emergency_doc.pop("_id")
     
     return EmergencyResponse(**emergency_doc)
@@ -85,38 +174,237 @@ async def get_emergency_contacts():
 
 @router.get("/", response_model=list[EmergencyResponse])
 async def get_user_emergencies(
+    request: Request,
     status_filter: Optional[EmergencyStatus] = None,
-    limit: int = 20,
-    current_user = Depends(get_current_user)
+    limit: int = Query(20, ge=1, le=settings.PAGE_MAX_SIZE),
+    cursor: Optional[str] = None,
+    current_user = Depends(get_current_identity)
 ):
-    """Get all emergencies for current user"""
+    """Get emergencies for current user, newest first (paged like GET /trips)"""
     emergencies_collection = db.get_collection("emergencies")
     
     # Build query
     query = {"user_id": current_user.id}
     if status_filter:
         query["status"] = status_filter.value
+    try:
+        query = after_cursor(query, cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     
-    # Get emergencies
-    emergencies = await emergencies_collection.find(
-        query,
-        sort=[("created_at", -1)],
-        limit=limit
-    ).to_list(length=limit)
+    async def build():
+        emergencies = await emergencies_collection.find(
+            query,
+            sort=PAGE_SORT,
+            limit=limit
+        ).to_list(length=limit)
+        
+        # Convert to response format
+        result = []
+        for emergency in emergencies:
+            emergency["id"] = str(emergency.pop("_id"))
+            result.append(EmergencyResponse(**emergency))
+        return result
+    
+    return await response_cache.respond(
+        request,
+        current_user.id,
+        build,
+        extra_headers=lambda result: next_page_headers(result, limit)
+    )
+
+
+@router.get("/nearby", response_model=list[EmergencyResponse])
+async def get_nearby_emergencies(
+    latitude: float,
+    longitude: float,
+    radius_km: float = 5,
+    statuses: List[EmergencyStatus] = Query([EmergencyStatus.ACTIVE]),
+    limit: int = 100,
+    current_user = Depends(require_dispatcher)
+):
+    """Get emergencies within a radius of a point, nearest first (dispatchers only)"""
+    if not valid_coordinate(latitude, longitude):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid coordinates"
+        )
+    if not 0 < radius_km <= MAX_SEARCH_RADIUS_KM:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"radius_km must be between 0 and {MAX_SEARCH_RADIUS_KM}"
+        )
+    check_search_limit(limit)
+    
+    emergencies_collection = db.get_collection("emergencies")
+    cursor = emergencies_collection.aggregate([
+        {"$geoNear": {
+            "near": geo_point(latitude, longitude),
+            "key": "position",
+            "distanceField": "distance_m",
+            "maxDistance": radius_km * 1000,
+            "spherical": True,
+            "query": {"status": {"$in": [s.value for s in statuses]}}
+        }},
+        {"$limit": limit}
+    ])
     
-    # Convert to response format
     result = []
-    for emergency in emergencies:
+    async for emergency in cursor:
         emergency["id"] = str(emergency.pop("_id"))
+        emergency["distance_km"] = round(emergency.pop("distance_m") / 1000, 3)
         result.append(EmergencyResponse(**emergency))
     
     return result
 
 
+@router.get("/in-bbox", response_model=list[EmergencyResponse])
+async def get_emergencies_in_bbox(
+    min_latitude: float,
+    min_longitude: float,
+    max_latitude: float,
+    max_longitude: float,
+    statuses: List[EmergencyStatus] = Query([EmergencyStatus.ACTIVE]),
+    limit: int = 100,
+    current_user = Depends(require_dispatcher)
+):
+    """Get the most recent emergencies inside a bounding box (dispatchers only)"""
+    check_search_limit(limit)
+    try:
+        geometry = bbox_polygon(min_latitude, min_longitude, max_latitude, max_longitude)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    return await find_emergencies_within(geometry, statuses, limit)
+
+
+@router.post("/in-polygon", response_model=list[EmergencyResponse])
+async def get_emergencies_in_polygon(
+    polygon_query: EmergencyPolygonQuery,
+    current_user = Depends(require_dispatcher)
+):
+    """Get the most recent emergencies inside a polygon (dispatchers only)"""
+    check_search_limit(polygon_query.limit)
+    try:
+        geometry = ring_polygon(polygon_query.coordinates)
+        return await find_emergencies_within(geometry, polygon_query.statuses, polygon_query.limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except OperationFailure:
+        # MongoDB rejects self-intersecting rings
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid polygon")
+
+
+@router.get("/stream")
+async def stream_emergency_events(
+    last_event_id: Optional[str] = Header(None),
+    current_user = Depends(require_dispatcher)
+):
+    """Push emergency events to a dispatcher as server-sent events
+    
+    Sends "emergency.created" and "emergency.resolved" events carrying the
+    emergency, plus a comment every EVENT_HEARTBEAT_SECONDS. A client that
+    reconnects with Last-Event-ID gets the events it missed, or a "reset"
+    event when they are no longer known (reload GET /emergencies then). A
+    client too slow to keep up gets a "dropped" event and is disconnected.
+    """
+    async def event_stream():
+        with emergency_events.subscribe() as subscription:
+            yield "retry: 1000\n\n"
+            
+            last_seq = 0
+            if last_event_id:
+                missed = emergency_events.replay_after(last_event_id)
+                if missed is None:
+                    yield "event: reset\ndata: {}\n\n"
+                else:
+                    for event in missed:
+                        last_seq = event["seq"]
+                        yield sse_message(event)
+            
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), settings.EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                
+                if event is None:
+                    yield "event: dropped\ndata: {}\n\n"
+                    return
+                # Skip events already sent while replaying
+                if event["seq"] > last_seq:
+                    last_seq = event["seq"]
+                    yield sse_message(event)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+EMERGENCY_EXPORT_COLUMNS = [
+    "id", "user_id", "trip_id", "emergency_type", "status", "description",
+    "latitude", "longitude", "created_at", "resolved_at", "resolution_notes"
+]
+
+
+def emergency_export_row(emergency: dict) -> dict:
+    """Flat export row for an emergency document"""
+    location = emergency.get("location") or {}
+    return {
+        "id": str(emergency["_id"]),
+        "user_id": emergency["user_id"],
+        "trip_id": emergency.get("trip_id"),
+        "emergency_type": emergency.get("emergency_type"),
+        "status": emergency.get("status"),
+        "description": emergency.get("description"),
+        "latitude": location.get("latitude"),
+        "longitude": location.get("longitude"),
+        "created_at": emergency.get("created_at"),
+        "resolved_at": emergency.get("resolved_at"),
+        "resolution_notes": emergency.get("resolution_notes")
+    }
+
+
+@router.get("/export")
+async def export_emergencies(
+    export_format: ExportFormat = Query(ExportFormat.NDJSON, alias="format"),
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    user_id: Optional[str] = None,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Stream emergency history as NDJSON or CSV, oldest first (scoped like GET /trips/export)"""
+    try:
+        query = created_range(export_owner_query(current_user, user_id), start, end)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    emergencies_collection = db.get_collection("emergencies")
+    cursor = emergencies_collection.find(
+        query,
+        projection={"position": 0},
+        sort=EXPORT_SORT,
+        batch_size=settings.EXPORT_CHUNK_ROWS
+    )
+    
+    return export_response(
+        cursor, export_format, EMERGENCY_EXPORT_COLUMNS, emergency_export_row, "emergencies"
+    )
+
+
 @router.get("/{emergency_id}", response_model=EmergencyResponse)
 async def get_emergency_by_id(
     emergency_id: str,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_identity)
 ):
     """Get a specific emergency by ID"""
     try:
@@ -147,7 +435,7 @@ async def get_emergency_by_id(
 async def resolve_emergency(
     emergency_id: str,
     resolution_data: EmergencyUpdate,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_identity)
 ):
     """Resolve an emergency"""
     try:
@@ -191,9 +479,12 @@ async def resolve_emergency(
                 detail="Failed to resolve emergency"
             )
         
+        response_cache.bump(current_user.id)
+        
         # Get updated emergency
         emergency_doc = await emergencies_collection.find_one({"_id": ObjectId(emergency_id)})
         emergency_doc["id"] = str(emergency_doc.pop("_id"))
+        publish_emergency("emergency.resolved", emergency_doc)
         
         return EmergencyResponse(**emergency_doc)
         
@@ -0,0 +1,73 @@
+from typing import Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, status
+from app.config.settings import settings
+from app.routers.auth import require_dispatcher
+from app.utils.active_trips import active_trips
+from app.utils.geo import valid_coordinate
+from app.schemas.pydantic_models import (
+    FleetCluster,
+    FleetLiveResponse,
+    FleetPosition
+)
+
+
+router = APIRouter(
+    prefix="/fleet",
+    tags=["Fleet"]
+)
+
+
+def parse_bbox(bbox: str) -> Tuple[float, float, float, float]:
+    """Parse a "min_lng,min_lat,max_lng,max_lat" bounding box (GeoJSON order)"""
+    try:
+        min_longitude, min_latitude, max_longitude, max_latitude = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox must be min_longitude,min_latitude,max_longitude,max_latitude"
+        )
+    
+    if not (valid_coordinate(min_latitude, min_longitude) and valid_coordinate(max_latitude, max_longitude)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox coordinates are out of range"
+        )
+    if min_latitude >= max_latitude or min_longitude >= max_longitude:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox minimums must be below its maximums"
+        )
+    return min_latitude, min_longitude, max_latitude, max_longitude
+
+
+@router.get("/live", response_model=FleetLiveResponse)
+async def get_live_fleet(
+    bbox: str,
+    cluster: Optional[bool] = None,
+    current_user = Depends(require_dispatcher)
+):
+    """Get drivers on an in-progress trip inside a viewport (dispatchers only)
+    
+    Positions come from this process's active trip registry. By default they
+    are clustered when more than FLEET_MAX_POSITIONS drivers are in view;
+    pass cluster=true or cluster=false to force either form.
+    """
+    viewport = parse_bbox(bbox)
+    grid = active_trips.grid
+    total = grid.count_in(*viewport)
+    
+    clustered = cluster if cluster is not None else total > settings.FLEET_MAX_POSITIONS
+    if clustered:
+        clusters = grid.clusters_in(*viewport, settings.FLEET_CLUSTER_DIVISIONS)
+        return FleetLiveResponse(
+            total=total,
+            clustered=True,
+            clusters=[FleetCluster(**item) for item in clusters]
+        )
+    
+    positions = grid.positions_in(*viewport, settings.FLEET_MAX_POSITIONS)
+    return FleetLiveResponse(
+        total=len(positions),
+        clustered=False,
+        positions=[FleetPosition(**position) for position in positions]
+    )
@@ -3,7 +3,7 @@ from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
 from bson import ObjectId
 from app.config.database import db
-from app.routers.auth import get_current_user
+from app.routers.auth import get_current_identity
 from app.schemas.pydantic_models import (
     SafetyCheckCreate, 
     SafetyCheckResponse,
@@ -11,6 +11,8 @@ from app.schemas.pydantic_models import (
     SafetyCheckStatus
 )
 from app.routers.trips import check_active_trip
+from app.utils.user_stats import increment_user_stats
+from app.utils.response_cache import response_cache
 
 
 router = APIRouter(
@@ -22,7 +24,7 @@ router = APIRouter(
 @router.post("/", response_model=SafetyCheckResponse, status_code=status.HTTP_201_CREATED)
 async def create_safety_check(
     check_data: SafetyCheckCreate,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_identity)
 ):
     """Create a new safety check (must be done before starting a trip)"""
     # Check if user has an active trip
@@ -57,7 +59,7 @@ async def create_safety_check(
 
 @router.get("/current", response_model=SafetyCheckResponse)
 async def get_current_safety_check(
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_identity)
 ):
     """Get the latest safety check for current user"""
     safety_checks_collection = db.get_collection("safety_checks")
@@ -82,7 +84,7 @@ async def get_current_safety_check(
 async def update_safety_check_items(
     check_id: str,
     items: List[SafetyCheckItem],
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_identity)
 ):
     """Update items in a safety check"""
     try:
@@ -135,7 +137,7 @@ async def update_safety_check_items(
 @router.post("/{check_id}/approve", response_model=SafetyCheckResponse)
 async def approve_safety_check(
     check_id: str,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_identity)
 ):
     """Approve a safety check (all items must be checked)"""
     try:
@@ -169,9 +171,10 @@ async def approve_safety_check(
                 detail="All safety check items must be verified before approval"
             )
         
-        # Approve the safety check
+        # Approve the safety check, unless a concurrent request settled it
+        # first: only the request that wins counts it in the user's stats
         result = await safety_checks_collection.update_one(
-            {"_id": ObjectId(check_id)},
+            {"_id": ObjectId(check_id), "status": SafetyCheckStatus.PENDING.value},
             {
                 "$set": {
                     "status": SafetyCheckStatus.PASSED.value,
@@ -182,10 +185,13 @@ async def approve_safety_check(
         
         if result.modified_count == 0:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to approve safety check"
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Safety check already approved or rejected"
             )
         
+        await increment_user_stats(current_user.id, safety_checks_passed=1)
+        response_cache.bump(current_user.id)
+        
         # Get updated check
         check_doc = await safety_checks_collection.find_one({"_id": ObjectId(check_id)})
         check_doc["id"] = str(check_doc.pop("_id"))
@@ -204,7 +210,7 @@ async def approve_safety_check(
 @router.get("/{check_id}", response_model=SafetyCheckResponse)
 async def get_safety_check_by_id(
     check_id: str,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_identity)
 ):
     """Get a specific safety check by ID"""
     try:
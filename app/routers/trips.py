@@ -1,57 +1,305 @@
-from datetime import datetime, timedelta
-from math import radians, sin, cos, sqrt, atan2
-from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import json
+import logging
+from datetime import date, datetime, timedelta, timezone
+from functools import partial
+from typing import Dict, List, Optional, Union
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, UploadFile, WebSocket, WebSocketDisconnect, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from bson import ObjectId
+from pymongo import ReturnDocument
 from app.config.database import db
-from app.routers.auth import get_current_user
+from app.config.settings import settings
+from app.routers.auth import get_current_identity, get_current_user, require_dispatcher
+from app.utils import route_store
+from app.utils.user_stats import increment_user_stats, finished_trip_deltas
+from app.utils.daily_rollups import increment_rollup, emergency_rollup_deltas
+from app.utils.polyline import encode_route
+from app.utils.response_cache import response_cache
+from app.utils.location_buffer import location_buffer
+from app.utils.active_trips import active_trips
+from app.utils.geo import geo_point, valid_coordinate
+from app.utils.pagination import PAGE_SORT, after_cursor, next_page_headers
+from app.utils.exports import EXPORT_SORT, created_range, export_owner_query, export_response
+from app.utils.route_export import gpx_chunks, geojson_chunks
+from app.utils.trip_import import import_trip_files
+from app.utils.route_geometry import (
+    path_distance_km,
+    compute_route_metrics,
+    simplify_route,
+    simplify_preview,
+    trip_path
+)
 from app.schemas.pydantic_models import (
     TripCreate, 
     TripResponse, 
+    TripSummaryResponse,
     TripUpdate,
     TripLocationUpdate,
+    TripLocationAck,
     TripStatus,
-    LocationPoint
+    LocationPoint,
+    RoutePage,
+    RouteFormat,
+    TripView,
+    ExportFormat,
+    UserResponse,
+    UserRole,
+    VehicleType,
+    TripImportReport
 )
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/trips",
     tags=["Trips"]
 )
 
+# Attempts to append when another request moves the last point concurrently
+LOCATION_APPEND_RETRIES = 3
+
+# Error frames of the location stream, by code
+STREAM_ERRORS = {
+    "unsupported_frame": "Only text frames are accepted",
+    "invalid_frame": "Frames must hold a location, an ordered list of locations or a flush request",
+    "invalid_locations": "Locations must have valid coordinates and fit in one batch",
+    "out_of_order": "Locations must be sent in order",
+    "invalid_time": "Locations must be stamped between the trip start and now, points dropped",
+    "conflict": "Concurrent location updates, points retried with the next frame",
+    "unavailable": "Locations could not be stored, points retried with the next frame",
+    "trip_not_found": "Active trip not found"
+}
+
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Convert a datetime to naive UTC, the form stored in MongoDB"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
 
-def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Calculate distance in km between two GPS coordinates"""
-    R = 6371  # Earth's radius in km
+
+def build_location_point(location_data: TripLocationUpdate) -> LocationPoint:
+    """Build a route point from a location update, stamped in naive UTC"""
+    timestamp = to_naive_utc(location_data.timestamp) or datetime.utcnow()
     
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
+    return LocationPoint(
+        latitude=location_data.latitude,
+        longitude=location_data.longitude,
+        altitude=location_data.altitude,
+        accuracy=location_data.accuracy,
+        speed=location_data.speed,
+        timestamp=timestamp
+    )
+
+
+def validate_location_batch(locations: List[TripLocationUpdate]) -> List[LocationPoint]:
+    """Validate an ordered batch of location updates and build its route points"""
+    if not locations:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one location is required"
+        )
     
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1-a))
+    if len(locations) > settings.LOCATION_BATCH_MAX_POINTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch can contain at most {settings.LOCATION_BATCH_MAX_POINTS} locations"
+        )
     
-    return R * c
+    points = []
+    for index, location_data in enumerate(locations):
+        if not valid_coordinate(location_data.latitude, location_data.longitude):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Location {index} has invalid coordinates"
+            )
+        
+        point = build_location_point(location_data)
+        if points and point.timestamp < points[-1].timestamp:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Location {index} is older than the previous one; batches must be ordered"
+            )
+        points.append(point)
+    
+    return points
+
+
+def check_location_times(
+    points: List[LocationPoint],
+    started_at: Optional[datetime],
+    now: Optional[datetime] = None
+) -> None:
+    """Reject points stamped before the trip started or ahead of server time
+    
+    A single bogus timestamp would otherwise become the trip's last location
+    and make every later real point look late.
+    """
+    now = now or datetime.utcnow()
+    latest = now + timedelta(seconds=settings.LOCATION_MAX_CLOCK_SKEW_SECONDS)
+    for index, point in enumerate(points):
+        if point.timestamp > latest:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Location {index} is timestamped in the future"
+            )
+        if started_at is not None and point.timestamp < started_at:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Location {index} is timestamped before the trip started"
+            )
+
+
+def merge_acks(earlier: Optional[TripLocationAck], later: TripLocationAck) -> TripLocationAck:
+    """Acknowledge several appends at once: the latest totals, and every point accepted"""
+    if earlier is None:
+        return later
+    return later.model_copy(update={
+        "accepted": earlier.accepted + later.accepted,
+        "late": earlier.late + later.late
+    })
+
+
+def stream_error(code: str) -> dict:
+    """Error frame of the location stream"""
+    return {"type": "error", "code": code, "detail": STREAM_ERRORS[code]}
+
+
+async def receive_stream_frame(websocket: WebSocket) -> str:
+    """Text of the next stream frame, answering binary frames with an error"""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+        if message.get("text") is not None:
+            return message["text"]
+        await websocket.send_json(stream_error("unsupported_frame"))
+
+
+def parse_stream_frame(text: str) -> Optional[List[TripLocationUpdate]]:
+    """Parse a stream frame: a location, an ordered list of them, or None for a flush request"""
+    payload = json.loads(text)
+    if isinstance(payload, dict) and payload.get("type") == "flush":
+        return None
+    
+    items = payload if isinstance(payload, list) else [payload]
+    return [TripLocationUpdate(**item) for item in items]
+
+
+# Fields read for summary listings: everything but the route, so long
+# trips cost the same as short ones. Trips created before point_count was
+# tracked count the points of their embedded route instead.
+TRIP_SUMMARY_PROJECTION = {
+    **{field: 1 for field in TripSummaryResponse.model_fields if field not in ("id", "point_count")},
+    "point_count": {"$ifNull": ["$point_count", {"$size": {"$ifNull": ["$route", []]}}]}
+}
+
+
+def trip_summary_pipeline(query: dict, sort: list, limit: Optional[int] = None) -> List[dict]:
+    """Aggregation reading trips in summary form"""
+    pipeline = [{"$match": query}, {"$sort": dict(sort)}]
+    if limit is not None:
+        pipeline.append({"$limit": limit})
+    pipeline.append({"$project": TRIP_SUMMARY_PROJECTION})
+    return pipeline
+
+
+class RouteOptions:
+    """Query parameters controlling how trip routes are returned"""
+    
+    def __init__(
+        self,
+        route_format: RouteFormat = RouteFormat.POINTS,
+        tolerance_m: Optional[float] = None,
+        max_points: Optional[int] = None
+    ):
+        if tolerance_m is not None and tolerance_m <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="tolerance_m must be positive"
+            )
+        if max_points is not None and max_points < 2:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="max_points must be at least 2"
+            )
+        
+        self.route_format = route_format
+        self.tolerance_m = tolerance_m
+        self.max_points = max_points
+    
+    @property
+    def simplified(self) -> bool:
+        return self.tolerance_m is not None or self.max_points is not None
+
+
+def uses_simplified_cache(trip_doc: dict, options: RouteOptions) -> bool:
+    """Whether the route cached at completion is detailed enough for the request"""
+    cached = trip_doc.get("simplified_route")
+    if cached is None or not options.simplified:
+        return False
+    if options.tolerance_m is not None:
+        return options.tolerance_m >= trip_doc.get("simplified_tolerance_m", float("inf"))
+    return options.max_points <= len(cached)
+
+
+async def load_response_routes(trip_docs: List[dict], options: RouteOptions) -> Dict[str, list]:
+    """Load the routes to return for trips, simplifying them when requested"""
+    full_routes = await route_store.load_routes(
+        [trip for trip in trip_docs if not uses_simplified_cache(trip, options)]
+    )
+    
+    routes = {}
+    for trip in trip_docs:
+        trip_id = str(trip["_id"])
+        routes[trip_id] = full_routes[trip_id] if trip_id in full_routes else trip["simplified_route"]
+    
+    if not options.simplified:
+        return routes
+    
+    # Simplification is CPU-bound: keep it off the event loop
+    def simplify_all() -> Dict[str, list]:
+        return {
+            trip_id: simplify_route(route, options.tolerance_m, options.max_points)
+            for trip_id, route in routes.items()
+        }
+    
+    return await asyncio.to_thread(simplify_all)
+
+
+def set_response_route(trip_doc: dict, route: list, options: RouteOptions) -> None:
+    """Attach a route to a trip document in the requested response format"""
+    if options.route_format == RouteFormat.ENCODED:
+        trip_doc["route"] = []
+        trip_doc["route_encoded"] = encode_route(route)
+    else:
+        trip_doc["route"] = route
+
+
+async def build_trip_response(
+    trip_doc: dict,
+    options: Optional[RouteOptions] = None
+) -> TripResponse:
+    """Build a trip response, loading its route from the points store"""
+    options = options or RouteOptions()
+    routes = await load_response_routes([trip_doc], options)
+    
+    trip_doc["id"] = str(trip_doc.pop("_id"))
+    set_response_route(trip_doc, routes[trip_doc["id"]], options)
+    return TripResponse(**trip_doc)
 
 
 async def check_active_trip(user_id: str) -> bool:
     """Check if user has an active trip"""
-    trips_collection = db.get_collection("trips")
-    active_trip = await trips_collection.find_one({
-        "user_id": user_id,
-        "status": TripStatus.IN_PROGRESS.value
-    })
-    return active_trip is not None
+    return await active_trips.get(user_id) is not None
 
 
 async def get_active_trip(user_id: str) -> Optional[dict]:
-    """Get user's active trip if exists"""
-    trips_collection = db.get_collection("trips")
-    return await trips_collection.find_one({
-        "user_id": user_id,
-        "status": TripStatus.IN_PROGRESS.value
-    })
+    """Get user's active trip registry entry if exists (see app.utils.active_trips)"""
+    return await active_trips.get(user_id)
 
 
 async def get_valid_safety_check(user_id: str) -> Optional[dict]:
@@ -63,12 +311,160 @@ async def get_valid_safety_check(user_id: str) -> Optional[dict]:
     }, sort=[("passed_at", -1)])
 
 
+async def restore_trip_totals(
+    trip_filter: dict,
+    trip_doc: dict,
+    previous: Optional[dict],
+    point_count: int
+) -> None:
+    """Undo an append whose points could not be stored, unless another append followed it"""
+    restored = {
+        "point_count": trip_doc.get("point_count") or 0,
+        "distance_km": trip_doc.get("distance_km") or 0,
+        "duration_minutes": trip_doc.get("duration_minutes") or 0,
+        "last_location": previous
+    }
+    update = {"$set": restored}
+    if previous is not None:
+        restored["last_position"] = geo_point(previous["latitude"], previous["longitude"])
+    else:
+        update["$unset"] = {"last_position": ""}
+    
+    result = await db.get_collection("trips").update_one(
+        {**trip_filter, "point_count": point_count},
+        update
+    )
+    if result.matched_count == 0:
+        logger.error("Could not restore the totals of trip %s after a failed point write", trip_filter["_id"])
+
+
+async def append_trip_locations(
+    trip_id: str,
+    user_id: str,
+    points: List[LocationPoint]
+) -> Optional[TripLocationAck]:
+    """Append GPS points to an active trip, keeping its totals up to date"""
+    trips_collection = db.get_collection("trips")
+    trip_filter = {
+        "_id": ObjectId(trip_id),
+        "user_id": user_id,
+        "status": TripStatus.IN_PROGRESS.value
+    }
+    
+    for attempt in range(LOCATION_APPEND_RETRIES):
+        # Only the last stored point is needed to extend the running totals:
+        # take it from the active trip registry, or read it after a conflict
+        trip_doc = active_trips.peek(user_id, trip_id) if attempt == 0 else None
+        if trip_doc is None:
+            trip_doc = await trips_collection.find_one(
+                trip_filter,
+                projection={
+                    "started_at": 1,
+                    "point_count": 1,
+                    "last_location": 1,
+                    "distance_km": 1,
+                    "duration_minutes": 1,
+                    "route": {"$slice": -1}
+                }
+            )
+        
+        if trip_doc is None:
+            active_trips.discard(user_id, trip_id)
+            return None
+        
+        check_location_times(points, trip_doc.get("started_at"))
+        
+        previous = trip_doc.get("last_location")
+        if previous is None and trip_doc.get("route"):
+            previous = trip_doc["route"][-1]
+        
+        # Points older than the last stored one (an offline queue flushed
+        # after live pings) are stored, but neither extend the running totals
+        # nor move the trip's current position: completion measures the
+        # whole route in time order
+        point_docs = [point.dict() for point in points]
+        fresh = [
+            point for point in point_docs
+            if previous is None or point["timestamp"] >= previous["timestamp"]
+        ]
+        
+        # point_count acts as a version: the update only applies if no other
+        # append landed since the read above, which also reserves the route
+        # indexes the new points are stored at
+        point_count = trip_doc.get("point_count")
+        update = {"$set": {"point_count": (point_count or 0) + len(points)}}
+        if fresh:
+            # Distance covered from the last stored point through the new ones
+            duration = 0
+            if trip_doc.get("started_at"):
+                duration = (fresh[-1]["timestamp"] - trip_doc["started_at"]).total_seconds() / 60
+            
+            update["$inc"] = {"distance_km": path_distance_km(fresh, start=previous)}
+            update["$set"].update({
+                "last_location": fresh[-1],
+                "last_position": geo_point(fresh[-1]["latitude"], fresh[-1]["longitude"]),
+                "duration_minutes": max(int(duration), 0)
+            })
+        
+        updated = await trips_collection.find_one_and_update(
+            {**trip_filter, "point_count": point_count},
+            update,
+            projection={"distance_km": 1, "duration_minutes": 1, "point_count": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        
+        if updated is not None:
+            # Totals are only reported, and the registry only moved, once the
+            # points are stored: a failed write puts the trip back as it was
+            try:
+                await location_buffer.append(trip_id, point_count or 0, point_docs)
+            except Exception:
+                await restore_trip_totals(trip_filter, trip_doc, previous, updated["point_count"])
+                active_trips.discard(user_id, trip_id)
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Locations could not be stored, please retry"
+                )
+            
+            last_location = fresh[-1] if fresh else previous
+            active_trips.advance(
+                user_id,
+                trip_id,
+                point_count=updated["point_count"],
+                last_location=last_location,
+                distance_km=updated["distance_km"],
+                duration_minutes=updated["duration_minutes"]
+            )
+            response_cache.bump(user_id)
+            
+            return TripLocationAck(
+                trip_id=trip_id,
+                accepted=len(points),
+                late=len(point_docs) - len(fresh),
+                point_count=updated["point_count"],
+                distance_km=updated["distance_km"],
+                duration_minutes=updated["duration_minutes"],
+                last_location=LocationPoint(**last_location)
+            )
+    
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Concurrent location updates, please retry"
+    )
+
+
 @router.post("/", response_model=TripResponse, status_code=status.HTTP_201_CREATED)
 async def create_trip(
     trip_data: TripCreate,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_identity)
 ):
     """Start a new trip (requires valid safety check)"""
+    if not valid_coordinate(trip_data.origin_latitude, trip_data.origin_longitude):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Origin has invalid coordinates"
+        )
+    
     # Check for existing active trip
     if await check_active_trip(current_user.id):
         raise HTTPException(
@@ -101,11 +497,13 @@ async def create_trip(
         "user_id": current_user.id,
         "vehicle_type": trip_data.vehicle_type.value,
         "status": TripStatus.IN_PROGRESS.value,
-        "route": [],
         "origin": origin.dict(),
         "destination": None,
         "distance_km": 0.0,
         "duration_minutes": 0,
+        "point_count": 0,
+        "last_location": None,
+        "last_position": geo_point(origin.latitude, origin.longitude),
         "safety_check_id": str(safety_check["_id"]),
         "started_at": datetime.utcnow(),
         "completed_at": None,
@@ -114,6 +512,9 @@ async def create_trip(
     
     result = await trips_collection.insert_one(trip_doc)
     trip_id = str(result.inserted_id)
+    active_trips.add(trip_doc)
+    await increment_user_stats(current_user.id, total_trips=1, active_trips=1)
+    response_cache.bump(current_user.id)
     
     # Return response
     trip_doc["id"] = trip_id
@@ -124,10 +525,21 @@ async def create_trip(
 
 @router.get("/active", response_model=TripResponse)
 async def get_active_trip_info(
-    current_user = Depends(get_current_user)
+    route_options: RouteOptions = Depends(),
+    current_user = Depends(get_current_identity)
 ):
     """Get current active trip"""
-    trip_doc = await get_active_trip(current_user.id)
+    active_trip = await get_active_trip(current_user.id)
+    
+    trip_doc = None
+    if active_trip is not None:
+        trips_collection = db.get_collection("trips")
+        trip_doc = await trips_collection.find_one({
+            "_id": active_trip["_id"],
+            "status": TripStatus.IN_PROGRESS.value
+        })
+        if trip_doc is None:
+            active_trips.discard(current_user.id, str(active_trip["_id"]))
     
     if trip_doc is None:
         raise HTTPException(
@@ -135,84 +547,66 @@ async def get_active_trip_info(
             detail="No active trip found"
         )
     
-    trip_doc["id"] = str(trip_doc.pop("_id"))
-    return TripResponse(**trip_doc)
+    return await build_trip_response(trip_doc, route_options)
 
 
-@router.post("/{trip_id}/location", response_model=TripResponse)
+@router.post("/{trip_id}/location", response_model=Union[TripLocationAck, TripResponse])
 async def update_trip_location(
     trip_id: str,
     location_data: TripLocationUpdate,
-    current_user = Depends(get_current_user)
+    include_trip: bool = False,
+    current_user = Depends(get_current_identity)
 ):
-    """Update trip with new GPS location"""
+    """Append a GPS location to an active trip"""
     try:
-        trips_collection = db.get_collection("trips")
+        # Create location point
+        location = validate_location_batch([location_data])[0]
         
-        # Verify trip ownership and status
-        trip_doc = await trips_collection.find_one({
-            "_id": ObjectId(trip_id),
-            "user_id": current_user.id,
-            "status": TripStatus.IN_PROGRESS.value
-        })
+        ack = await append_trip_locations(trip_id, current_user.id, [location])
         
-        if trip_doc is None:
+        if ack is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Active trip not found"
             )
         
-        # Create location point
-        location = LocationPoint(
-            latitude=location_data.latitude,
-            longitude=location_data.longitude,
-            altitude=location_data.altitude,
-            accuracy=location_data.accuracy,
-            speed=location_data.speed,
-            timestamp=datetime.utcnow()
-        )
-        
-        # Add to route
-        route = trip_doc.get("route", [])
-        route.append(location.dict())
+        if not include_trip:
+            return ack
         
-        # Calculate distance if we have a previous point
-        if len(route) >= 2:
-            prev_point = route[-2]
-            distance = haversine_distance(
-                prev_point["latitude"], prev_point["longitude"],
-                location.latitude, location.longitude
-            )
-            trip_doc["distance_km"] += distance
+        # Full trip requested (legacy behaviour)
+        trips_collection = db.get_collection("trips")
+        trip_doc = await trips_collection.find_one({"_id": ObjectId(trip_id)})
         
-        # Update duration
-        if trip_doc.get("started_at"):
-            duration = (datetime.utcnow() - trip_doc["started_at"]).total_seconds() / 60
-            trip_doc["duration_minutes"] = int(duration)
+        return await build_trip_response(trip_doc)
         
-        # Update trip
-        result = await trips_collection.update_one(
-            {"_id": ObjectId(trip_id)},
-            {
-                "$set": {
-                    "route": route,
-                    "distance_km": trip_doc["distance_km"],
-                    "duration_minutes": trip_doc["duration_minutes"]
-                }
-            }
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid trip ID"
         )
+
+
+@router.post("/{trip_id}/locations", response_model=TripLocationAck)
+async def update_trip_locations(
+    trip_id: str,
+    locations: List[TripLocationUpdate],
+    current_user = Depends(get_current_identity)
+):
+    """Append an ordered batch of buffered GPS locations to an active trip"""
+    try:
+        points = validate_location_batch(locations)
         
-        if result.modified_count == 0:
+        ack = await append_trip_locations(trip_id, current_user.id, points)
+        
+        if ack is None:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to update trip location"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Active trip not found"
             )
         
-        # Get updated trip
-        trip_doc = await trips_collection.find_one({"_id": ObjectId(trip_id)})
-        trip_doc["id"] = str(trip_doc.pop("_id"))
-        
-        return TripResponse(**trip_doc)
+        return ack
         
     except HTTPException:
         raise
@@ -223,13 +617,145 @@ async def update_trip_location(
         )
 
 
+@router.websocket("/{trip_id}/stream")
+async def stream_trip_locations(
+    websocket: WebSocket,
+    trip_id: str,
+    token: Optional[str] = None
+):
+    """Stream GPS locations to an active trip over one authenticated connection
+    
+    The token (query parameter or bearer header) and the trip are checked
+    once, when connecting. Each text frame holds a location update or an
+    ordered list of them, appended as soon as it arrives (the write-behind
+    buffer coalesces the writes). Acknowledgements are batched: an "ack"
+    frame carrying the TripLocationAck of the latest append, with the points
+    accepted since the previous ack, is sent every TRIP_STREAM_ACK_POINTS
+    points, TRIP_STREAM_ACK_SECONDS after the first unacknowledged one, or
+    on a {"type": "flush"} frame. Invalid frames are answered with an
+    "error" frame (see STREAM_ERRORS) and dropped; points whose append failed
+    are retried with the next frame.
+    """
+    if token is None:
+        scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer":
+            token = credentials
+    
+    try:
+        current_user = await get_current_identity(token or "")
+        trip_doc = await db.get_collection("trips").find_one(
+            {
+                "_id": ObjectId(trip_id),
+                "user_id": current_user.id,
+                "status": TripStatus.IN_PROGRESS.value
+            },
+            projection={"_id": 1}
+        )
+    except Exception:
+        trip_doc = None
+    
+    if trip_doc is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    loop = asyncio.get_running_loop()
+    pending: List[LocationPoint] = []
+    unacked: Optional[TripLocationAck] = None
+    ack_at = None
+    last_timestamp = None
+    
+    try:
+        while True:
+            timeout = None if ack_at is None else max(ack_at - loop.time(), 0)
+            try:
+                text = await asyncio.wait_for(receive_stream_frame(websocket), timeout)
+            except asyncio.TimeoutError:
+                text = None
+            
+            # A flush request, or the ack deadline, acknowledges what was appended
+            flush = text is None
+            if text is not None:
+                try:
+                    locations = parse_stream_frame(text)
+                    if locations is not None:
+                        points = validate_location_batch(locations)
+                except HTTPException:
+                    await websocket.send_json(stream_error("invalid_locations"))
+                    continue
+                except (ValueError, TypeError):
+                    await websocket.send_json(stream_error("invalid_frame"))
+                    continue
+                
+                if locations is None:
+                    flush = True
+                elif last_timestamp and points[0].timestamp < last_timestamp:
+                    await websocket.send_json(stream_error("out_of_order"))
+                    continue
+                else:
+                    pending.extend(points)
+                    last_timestamp = points[-1].timestamp
+            
+            if pending:
+                try:
+                    ack = await append_trip_locations(trip_id, current_user.id, pending)
+                except HTTPException as e:
+                    if e.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY:
+                        await websocket.send_json(stream_error("invalid_time"))
+                        pending.clear()
+                    else:
+                        # Concurrent append or storage failure: keep the
+                        # points and retry with the next frame
+                        code = "conflict" if e.status_code == status.HTTP_409_CONFLICT else "unavailable"
+                        await websocket.send_json(stream_error(code))
+                except Exception:
+                    # Database errors (timeouts, network failures) are retried the same way
+                    logger.exception("Failed to append streamed locations of trip %s", trip_id)
+                    await websocket.send_json(stream_error("unavailable"))
+                else:
+                    if ack is None:
+                        await websocket.send_json(stream_error("trip_not_found"))
+                        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                        return
+                    
+                    pending.clear()
+                    unacked = merge_acks(unacked, ack)
+            
+            if unacked is not None and (flush or unacked.accepted >= settings.TRIP_STREAM_ACK_POINTS):
+                await websocket.send_json({"type": "ack", **jsonable_encoder(unacked)})
+                unacked = None
+            elif flush and text is not None and not pending:
+                await websocket.send_json({"type": "ack", "trip_id": trip_id, "accepted": 0})
+            
+            if unacked is None and not pending:
+                ack_at = None
+            elif ack_at is None or flush:
+                ack_at = loop.time() + settings.TRIP_STREAM_ACK_SECONDS
+        
+    except WebSocketDisconnect:
+        # Retry points whose append failed; there is no one left to report
+        # a failure to
+        if pending:
+            try:
+                await append_trip_locations(trip_id, current_user.id, pending)
+            except HTTPException as e:
+                logger.warning(
+                    "Dropped %d streamed locations of trip %s on disconnect: %s",
+                    len(pending), trip_id, e.detail
+                )
+            except Exception:
+                logger.exception(
+                    "Dropped %d streamed locations of trip %s on disconnect", len(pending), trip_id
+                )
+
+
 @router.put("/{trip_id}/complete", response_model=TripResponse)
 async def complete_trip(
     trip_id: str,
     end_latitude: float,
     end_longitude: float,
     end_address: Optional[str] = None,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_identity)
 ):
     """Complete a trip"""
     try:
@@ -243,19 +769,12 @@ async def complete_trip(
         })
         
         if trip_doc is None:
+            active_trips.discard(current_user.id, trip_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Active trip not found"
             )
         
-        # Calculate final distance
-        if trip_doc.get("origin"):
-            origin = trip_doc["origin"]
-            final_distance = haversine_distance(
-                origin["latitude"], origin["longitude"],
-                end_latitude, end_longitude
-            )
-        
         # Calculate final duration
         duration = 0
         if trip_doc.get("started_at"):
@@ -268,31 +787,72 @@ async def complete_trip(
             timestamp=datetime.utcnow()
         )
         
-        # Update trip to completed
+        # Measure the recorded path from origin to destination, including
+        # points still queued for writing
+        await location_buffer.flush()
+        route = await route_store.load_route(trip_doc)
+        trip_doc["destination"] = destination.dict()
+        metrics = compute_route_metrics(trip_path(trip_doc, route))
+        preview, preview_tolerance = await asyncio.to_thread(
+            simplify_preview,
+            route,
+            settings.ROUTE_SIMPLIFY_TOLERANCE_M,
+            settings.ROUTE_PREVIEW_MAX_POINTS
+        )
+        
+        # Update trip to completed, unless a concurrent request finished it
+        # first: only the request that wins applies the stats and rollups
         result = await trips_collection.update_one(
-            {"_id": ObjectId(trip_id)},
+            {"_id": ObjectId(trip_id), "status": TripStatus.IN_PROGRESS.value},
             {
                 "$set": {
                     "status": TripStatus.COMPLETED.value,
                     "destination": destination.dict(),
-                    "distance_km": final_distance if 'final_distance' in dir() else trip_doc.get("distance_km", 0),
+                    "distance_km": metrics["distance_km"],
                     "duration_minutes": int(duration),
+                    "max_speed_kmh": metrics["max_speed_kmh"],
+                    "bbox": metrics["bbox"],
+                    "simplified_route": preview,
+                    "simplified_tolerance_m": preview_tolerance,
                     "completed_at": datetime.utcnow()
                 }
             }
         )
         
-        if result.modified_count == 0:
+        if result.matched_count == 0:
+            active_trips.discard(current_user.id, trip_id)
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to complete trip"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Active trip not found"
             )
         
+        active_trips.discard(current_user.id, trip_id)
+        await increment_user_stats(
+            current_user.id,
+            active_trips=-1,
+            completed_trips=1,
+            total_distance_km=metrics["distance_km"],
+            total_duration_minutes=int(duration)
+        )
+        await increment_rollup(
+            current_user.id,
+            trip_doc.get("started_at"),
+            trips=1,
+            completed=1,
+            distance_km=metrics["distance_km"],
+            duration_minutes=int(duration)
+        )
+        
+        # No more points will be appended, so the route can be compacted
+        if settings.ROUTE_STORAGE_FORMAT == RouteFormat.ENCODED.value:
+            await route_store.compact_route(trip_id)
+        
+        response_cache.bump(current_user.id)
+        
         # Get updated trip
         trip_doc = await trips_collection.find_one({"_id": ObjectId(trip_id)})
-        trip_doc["id"] = str(trip_doc.pop("_id"))
         
-        return TripResponse(**trip_doc)
+        return await build_trip_response(trip_doc)
         
     except HTTPException:
         raise
@@ -306,28 +866,40 @@ async def complete_trip(
 @router.put("/{trip_id}/emergency", response_model=TripResponse)
 async def set_trip_emergency(
     trip_id: str,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_identity)
 ):
     """Set trip status to emergency"""
     try:
         trips_collection = db.get_collection("trips")
         
-        result = await trips_collection.update_one(
-            {"_id": ObjectId(trip_id), "user_id": current_user.id},
-            {"$set": {"status": TripStatus.EMERGENCY.value}}
+        previous = await trips_collection.find_one_and_update(
+            {
+                "_id": ObjectId(trip_id),
+                "user_id": current_user.id,
+                "status": {"$ne": TripStatus.EMERGENCY.value}
+            },
+            {"$set": {"status": TripStatus.EMERGENCY.value}},
+            projection={"status": 1, "distance_km": 1, "duration_minutes": 1, "started_at": 1},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.modified_count == 0:
+        if previous is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Trip not found"
             )
         
+        active_trips.discard(current_user.id, trip_id)
+        await increment_user_stats(current_user.id, **finished_trip_deltas(previous))
+        await increment_rollup(
+            current_user.id, previous.get("started_at"), **emergency_rollup_deltas(previous)
+        )
+        response_cache.bump(current_user.id)
+        
         # Get updated trip
         trip_doc = await trips_collection.find_one({"_id": ObjectId(trip_id)})
-        trip_doc["id"] = str(trip_doc.pop("_id"))
         
-        return TripResponse(**trip_doc)
+        return await build_trip_response(trip_doc)
         
     except Exception:
         raise HTTPException(
@@ -336,40 +908,180 @@ async def set_trip_emergency(
         )
 
 
-@router.get("/", response_model=list[TripResponse])
+@router.get("/", response_model=Union[list[TripResponse], list[TripSummaryResponse]])
 async def get_user_trips(
+    request: Request,
     status_filter: Optional[TripStatus] = None,
-    limit: int = 20,
-    current_user = Depends(get_current_user)
+    limit: int = Query(20, ge=1, le=settings.PAGE_MAX_SIZE),
+    cursor: Optional[str] = None,
+    view: TripView = TripView.FULL,
+    route_options: RouteOptions = Depends(),
+    current_user = Depends(get_current_identity)
 ):
-    """Get all trips for current user"""
+    """Get trips for current user, newest first
+    
+    view=summary leaves out routes (get them from GET /trips/{trip_id}).
+    Full pages carry an X-Next-Cursor header; pass it back as cursor to get
+    the following page.
+    """
     trips_collection = db.get_collection("trips")
     
     # Build query
     query = {"user_id": current_user.id}
     if status_filter:
         query["status"] = status_filter.value
+    try:
+        query = after_cursor(query, cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     
-    # Get trips
-    trips = await trips_collection.find(
-        query,
-        sort=[("created_at", -1)],
-        limit=limit
-    ).to_list(length=limit)
+    async def build():
+        if view == TripView.SUMMARY:
+            trips = await trips_collection.aggregate(
+                trip_summary_pipeline(query, PAGE_SORT, limit)
+            ).to_list(length=limit)
+            
+            result = []
+            for trip in trips:
+                trip["id"] = str(trip.pop("_id"))
+                trip["point_count"] = trip.get("point_count") or 0
+                result.append(TripSummaryResponse(**trip))
+            return result
+        
+        trips = await trips_collection.find(
+            query,
+            sort=PAGE_SORT,
+            limit=limit
+        ).to_list(length=limit)
+        
+        # Convert to response format, loading all routes in one query
+        routes = await load_response_routes(trips, route_options)
+        result = []
+        for trip in trips:
+            trip["id"] = str(trip.pop("_id"))
+            set_response_route(trip, routes[trip["id"]], route_options)
+            result.append(TripResponse(**trip))
+        return result
+    
+    return await response_cache.respond(
+        request,
+        current_user.id,
+        build,
+        extra_headers=lambda result: next_page_headers(result, limit)
+    )
+
+
+TRIP_EXPORT_COLUMNS = [
+    "id", "user_id", "vehicle_type", "status",
+    "origin_latitude", "origin_longitude", "destination_latitude", "destination_longitude",
+    "distance_km", "duration_minutes", "max_speed_kmh", "point_count",
+    "started_at", "completed_at", "created_at"
+]
+
+
+def trip_export_row(trip: dict) -> dict:
+    """Flat export row for a trip document"""
+    origin = trip.get("origin") or {}
+    destination = trip.get("destination") or {}
+    return {
+        "id": str(trip["_id"]),
+        "user_id": trip["user_id"],
+        "vehicle_type": trip.get("vehicle_type"),
+        "status": trip.get("status"),
+        "origin_latitude": origin.get("latitude"),
+        "origin_longitude": origin.get("longitude"),
+        "destination_latitude": destination.get("latitude"),
+        "destination_longitude": destination.get("longitude"),
+        "distance_km": trip.get("distance_km", 0),
+        "duration_minutes": trip.get("duration_minutes", 0),
+        "max_speed_kmh": trip.get("max_speed_kmh"),
+        "point_count": trip.get("point_count") or 0,
+        "started_at": trip.get("started_at"),
+        "completed_at": trip.get("completed_at"),
+        "created_at": trip.get("created_at")
+    }
+
+
+@router.get("/export")
+async def export_trips(
+    export_format: ExportFormat = Query(ExportFormat.NDJSON, alias="format"),
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    user_id: Optional[str] = None,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Stream trip history (without routes) as NDJSON or CSV, oldest first
+    
+    from/to are UTC creation days, both inclusive. Drivers export their own
+    trips; dispatchers export every user's, or one user's with user_id.
+    """
+    try:
+        query = created_range(export_owner_query(current_user, user_id), start, end)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    trips_collection = db.get_collection("trips")
+    cursor = trips_collection.aggregate(
+        trip_summary_pipeline(query, EXPORT_SORT),
+        batchSize=settings.EXPORT_CHUNK_ROWS
+    )
+    
+    return export_response(cursor, export_format, TRIP_EXPORT_COLUMNS, trip_export_row, "trips")
+
+
+@router.post("/import", response_model=TripImportReport)
+async def import_trips(
+    files: List[UploadFile] = File(...),
+    vehicle_type: VehicleType = Form(VehicleType.CAR),
+    user_id: Optional[str] = Form(None),
+    dry_run: bool = Form(False),
+    current_user: UserResponse = Depends(require_dispatcher)
+):
+    """Import historical trips from GPX tracks or CSV traces (dispatchers only)
     
-    # Convert to response format
-    result = []
-    for trip in trips:
-        trip["id"] = str(trip.pop("_id"))
-        result.append(TripResponse(**trip))
+    CSV files need latitude, longitude and timestamp columns (altitude,
+    speed, accuracy and trip are optional; rows sharing a trip value form
+    one trip). Trips go to user_id, or to the dispatcher's own account.
+    Invalid files and trips are reported and skipped. For very large imports
+    use python -m app.scripts.import_trips instead.
+    """
+    target_id = user_id or current_user.id
+    if target_id != current_user.id:
+        users_collection = db.get_collection("users")
+        try:
+            target = await users_collection.find_one({"_id": ObjectId(target_id)}, projection={"_id": 1})
+        except Exception:
+            target = None
+        if target is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
     
-    return result
+    # Each file is read when a parser is free for it, one byte past the
+    # limit, so oversized files are reported without reading them whole
+    uploads = [
+        (upload.filename or "upload", partial(upload.read, settings.IMPORT_MAX_FILE_BYTES + 1))
+        for upload in files
+    ]
+    
+    report = await import_trip_files(uploads, target_id, vehicle_type.value, dry_run)
+    if not dry_run:
+        response_cache.bump(target_id)
+    return report
 
 
 @router.get("/{trip_id}", response_model=TripResponse)
 async def get_trip_by_id(
     trip_id: str,
-    current_user = Depends(get_current_user)
+    route_options: RouteOptions = Depends(),
+    current_user = Depends(get_current_identity)
 ):
     """Get a specific trip by ID"""
     try:
@@ -386,11 +1098,133 @@ async def get_trip_by_id(
                 detail="Trip not found"
             )
         
-        trip_doc["id"] = str(trip_doc.pop("_id"))
-        return TripResponse(**trip_doc)
+        return await build_trip_response(trip_doc, route_options)
         
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid trip ID"
         )
+
+
+@router.get("/{trip_id}/route", response_model=RoutePage)
+async def get_trip_route(
+    trip_id: str,
+    offset: int = 0,
+    limit: int = 500,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user = Depends(get_current_identity)
+):
+    """Get a page of a trip's route points, optionally within a time window"""
+    if offset < 0 or not 0 < limit <= settings.ROUTE_PAGE_MAX_POINTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"offset must be >= 0 and limit between 1 and {settings.ROUTE_PAGE_MAX_POINTS}"
+        )
+    
+    try:
+        trips_collection = db.get_collection("trips")
+        
+        trip_doc = await trips_collection.find_one(
+            {"_id": ObjectId(trip_id), "user_id": current_user.id},
+            projection={"route": 1, "point_count": 1}
+        )
+        
+        if trip_doc is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Trip not found"
+            )
+        
+        points, total = await route_store.get_route_page(
+            trip_doc, offset, limit, to_naive_utc(start), to_naive_utc(end)
+        )
+        next_offset = offset + len(points) if offset + len(points) < total else None
+        
+        return RoutePage(
+            trip_id=trip_id,
+            offset=offset,
+            total=total,
+            points=points,
+            next_offset=next_offset
+        )
+        
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid trip ID"
+        )
+
+
+async def load_route_file_trip(trip_id: str, current_user: UserResponse) -> dict:
+    """Get a trip whose route is downloaded as a file, with its pending points written"""
+    query = {"user_id": current_user.id}
+    # Dispatchers investigate incidents on any user's trip
+    if current_user.role == UserRole.DISPATCHER:
+        query = {}
+    
+    try:
+        query["_id"] = ObjectId(trip_id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid trip ID"
+        )
+    
+    trips_collection = db.get_collection("trips")
+    trip_doc = await trips_collection.find_one(
+        query,
+        projection={
+            "route": 1,
+            "point_count": 1,
+            "status": 1,
+            "vehicle_type": 1,
+            "started_at": 1,
+            "completed_at": 1
+        }
+    )
+    
+    if trip_doc is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Trip not found"
+        )
+    
+    # Points of a trip in progress may still be queued for writing
+    if trip_doc.get("status") == TripStatus.IN_PROGRESS.value:
+        await location_buffer.flush()
+    
+    return trip_doc
+
+
+@router.get("/{trip_id}/route.gpx")
+async def download_trip_route_gpx(
+    trip_id: str,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Stream a trip's route as a GPX track, with point speed and accuracy as extensions"""
+    trip_doc = await load_route_file_trip(trip_id, current_user)
+    
+    return StreamingResponse(
+        gpx_chunks(trip_doc, route_store.iter_route(trip_doc)),
+        media_type="application/gpx+xml",
+        headers={"Content-Disposition": f'attachment; filename="trip-{trip_id}.gpx"'}
+    )
+
+
+@router.get("/{trip_id}/route.geojson")
+async def download_trip_route_geojson(
+    trip_id: str,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Stream a trip's route as GeoJSON point features, with speed and accuracy properties"""
+    trip_doc = await load_route_file_trip(trip_id, current_user)
+    
+    return StreamingResponse(
+        geojson_chunks(trip_doc, route_store.iter_route(trip_doc)),
+        media_type="application/geo+json",
+        headers={"Content-Disposition": f'attachment; filename="trip-{trip_id}.geojson"'}
+    )
@@ -1,8 +1,8 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from bson import ObjectId
 from app.config.database import db
-from app.routers.auth import get_current_user
+from app.routers.auth import get_current_user, set_reissued_tokens, user_cache
 from app.schemas.pydantic_models import UserResponse, UserUpdate, VehicleType
 
 
@@ -21,6 +21,7 @@ async def get_current_user_info(current_user: UserResponse = Depends(get_current
 @router.put("/me", response_model=UserResponse)
 async def update_current_user(
     update_data: UserUpdate,
+    response: Response,
     current_user: UserResponse = Depends(get_current_user)
 ):
     """Update current user information"""
@@ -37,10 +38,10 @@ async def update_current_user(
     
     update_dict["updated_at"] = datetime.utcnow()
     
-    # Update user
+    # Update user; profile_version lets stateless tokens be re-issued
     result = await users_collection.update_one(
         {"_id": ObjectId(current_user.id)},
-        {"$set": update_dict}
+        {"$set": update_dict, "$inc": {"profile_version": 1}}
     )
     
     if result.modified_count == 0:
@@ -49,17 +50,22 @@ async def update_current_user(
             detail="Failed to update user"
         )
     
+    user_cache.invalidate(current_user.id)
+    
     # Get updated user
     user_doc = await users_collection.find_one({"_id": ObjectId(current_user.id)})
     user_doc["id"] = str(user_doc.pop("_id"))
     user_doc.pop("hashed_password")
+    user = UserResponse(**user_doc)
+    set_reissued_tokens(response, user_doc, user)
     
-    return UserResponse(**user_doc)
+    return user
 
 
 @router.put("/me/vehicle-preference", response_model=UserResponse)
 async def update_vehicle_preference(
     vehicle_type: VehicleType,
+    response: Response,
     current_user: UserResponse = Depends(get_current_user)
 ):
     """Update user's vehicle preference"""
@@ -71,7 +77,8 @@ async def update_vehicle_preference(
             "$set": {
                 "vehicle_preference": vehicle_type.value,
                 "updated_at": datetime.utcnow()
-            }
+            },
+            "$inc": {"profile_version": 1}
         }
     )
     
@@ -81,12 +88,16 @@ async def update_vehicle_preference(
             detail="Failed to update vehicle preference"
         )
     
+    user_cache.invalidate(current_user.id)
+    
     # Get updated user
     user_doc = await users_collection.find_one({"_id": ObjectId(current_user.id)})
     user_doc["id"] = str(user_doc.pop("_id"))
     user_doc.pop("hashed_password")
+    user = UserResponse(**user_doc)
+    set_reissued_tokens(response, user_doc, user)
     
-    return UserResponse(**user_doc)
+    return user
 
 
 @router.get("/{user_id}", response_model=UserResponse)
@@ -1,8 +1,12 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from app.config.database import db
-from app.routers.auth import get_current_user
+from app.config.settings import settings
+from app.routers.auth import get_current_identity
+from app.utils.pagination import PAGE_SORT, after_cursor, next_page_headers
 from app.schemas.pydantic_models import VehicleCreate, VehicleResponse
 
 
@@ -15,7 +19,7 @@ router = APIRouter(
 @router.post("/", response_model=VehicleResponse, status_code=status.HTTP_201_CREATED)
 async def create_vehicle(
     vehicle_data: VehicleCreate,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_identity)
 ):
     """Register a new vehicle for the user"""
     vehicles_collection = db.get_collection("vehicles")
@@ -42,7 +46,14 @@ async def create_vehicle(
         "created_at": datetime.utcnow()
     }
     
-    result = await vehicles_collection.insert_one(vehicle_doc)
+    # The unique license_plate index catches concurrent registrations
+    try:
+        result = await vehicles_collection.insert_one(vehicle_doc)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="License plate already registered"
+        )
     vehicle_id = str(result.inserted_id)
     
     # Return response
@@ -54,27 +65,41 @@ async def create_vehicle(
 
 @router.get("/", response_model=list[VehicleResponse])
 async def get_user_vehicles(
-    current_user = Depends(get_current_user)
+    response: Response,
+    limit: int = Query(settings.PAGE_MAX_SIZE, ge=1, le=settings.PAGE_MAX_SIZE),
+    cursor: Optional[str] = None,
+    current_user = Depends(get_current_identity)
 ):
-    """Get all vehicles for current user"""
+    """Get vehicles for current user, newest first (paged like GET /trips)"""
     vehicles_collection = db.get_collection("vehicles")
     
+    try:
+        query = after_cursor({"user_id": current_user.id}, cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
     vehicles = await vehicles_collection.find(
-        {"user_id": current_user.id}
-    ).to_list(length=100)
+        query,
+        sort=PAGE_SORT,
+        limit=limit
+    ).to_list(length=limit)
     
     result = []
     for vehicle in vehicles:
         vehicle["id"] = str(vehicle.pop("_id"))
         result.append(VehicleResponse(**vehicle))
     
+    response.headers.update(next_page_headers(result, limit))
     return result
 
 
 @router.get("/{vehicle_id}", response_model=VehicleResponse)
 async def get_vehicle_by_id(
     vehicle_id: str,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_identity)
 ):
     """Get a specific vehicle by ID"""
     try:
@@ -104,7 +129,7 @@ async def get_vehicle_by_id(
 @router.put("/{vehicle_id}/deactivate", response_model=VehicleResponse)
 async def deactivate_vehicle(
     vehicle_id: str,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_identity)
 ):
     """Deactivate a vehicle"""
     try:
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 from pydantic import BaseModel, EmailStr, Field
 from enum import Enum
 
@@ -31,6 +31,26 @@ class SafetyCheckStatus(str, Enum):
     FAILED = "failed"
 
 
+class RouteFormat(str, Enum):
+    POINTS = "points"
+    ENCODED = "encoded"
+
+
+class TripView(str, Enum):
+    FULL = "full"
+    SUMMARY = "summary"  # No route; see TripSummaryResponse
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class UserRole(str, Enum):
+    DRIVER = "driver"
+    DISPATCHER = "dispatcher"  # Safety desk: sees every user's emergencies
+
+
 # ==================== USER SCHEMAS ====================
 class UserBase(BaseModel):
     email: EmailStr
@@ -55,6 +75,7 @@ class UserUpdate(BaseModel):
 class UserResponse(UserBase):
     id: str
     vehicle_preference: Optional[VehicleType] = None
+    role: UserRole = UserRole.DRIVER
     created_at: datetime
     updated_at: Optional[datetime] = None
     
@@ -66,6 +87,7 @@ class UserInDB(UserBase):
     id: str
     hashed_password: str
     vehicle_preference: Optional[VehicleType] = None
+    role: UserRole = UserRole.DRIVER
     created_at: datetime
     updated_at: Optional[datetime] = None
     
@@ -74,15 +96,30 @@ class UserInDB(UserBase):
 
 
 # ==================== AUTH SCHEMAS ====================
+class UserIdentity(BaseModel):
+    id: str
+    email: str
+    full_name: Optional[str] = None
+    vehicle_preference: Optional[VehicleType] = None
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None
     user: UserResponse
 
 
 class TokenData(BaseModel):
     user_id: Optional[str] = None
     email: Optional[str] = None
+    full_name: Optional[str] = None
+    vehicle_preference: Optional[VehicleType] = None
+    profile_version: Optional[int] = None  # Set only on profile-carrying tokens
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 
 class LoginRequest(BaseModel):
@@ -157,6 +194,20 @@ class LocationPoint(BaseModel):
     timestamp: datetime
 
 
+class EncodedColumn(BaseModel):
+    values: str
+    nulls: Optional[str] = None
+
+
+class EncodedRoute(BaseModel):
+    format: str = "polyline6"
+    count: int
+    start_time: Optional[datetime] = None
+    coordinates: str
+    timestamps: str
+    columns: Dict[str, EncodedColumn] = {}
+
+
 class TripCreate(BaseModel):
     vehicle_type: VehicleType
     origin_latitude: float
@@ -181,10 +232,13 @@ class TripResponse(BaseModel):
     vehicle_type: VehicleType
     status: TripStatus
     route: List[LocationPoint] = []
+    route_encoded: Optional[EncodedRoute] = None
     origin: LocationPoint
     destination: Optional[LocationPoint] = None
     distance_km: float = 0.0
     duration_minutes: int = 0
+    max_speed_kmh: Optional[float] = None
+    bbox: Optional[List[float]] = None  # [min_lon, min_lat, max_lon, max_lat]
     safety_check_id: Optional[str] = None
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
@@ -194,12 +248,65 @@ class TripResponse(BaseModel):
         from_attributes = True
 
 
+class TripSummaryResponse(BaseModel):
+    """Trip without its route, for listings"""
+    id: str
+    user_id: str
+    vehicle_type: VehicleType
+    status: TripStatus
+    origin: LocationPoint
+    destination: Optional[LocationPoint] = None
+    distance_km: float = 0.0
+    duration_minutes: int = 0
+    max_speed_kmh: Optional[float] = None
+    bbox: Optional[List[float]] = None  # [min_lon, min_lat, max_lon, max_lat]
+    point_count: int = 0
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class TripImportFileReport(BaseModel):
+    filename: str
+    trips: int  # Valid trips found in the file
+    errors: List[str] = []
+
+
+class TripImportReport(BaseModel):
+    trips_imported: int
+    duplicates_skipped: int  # Trips imported before
+    points_imported: int
+    files: List[TripImportFileReport]
+
+
 class TripLocationUpdate(BaseModel):
     latitude: float
     longitude: float
     altitude: Optional[float] = None
     accuracy: Optional[float] = None
     speed: Optional[float] = None
+    timestamp: Optional[datetime] = None  # Device fix time, for buffered points
+
+
+class TripLocationAck(BaseModel):
+    trip_id: str
+    accepted: int
+    late: int = 0  # Older than the trip's last point: stored, not added to the totals
+    point_count: int
+    distance_km: float
+    duration_minutes: int
+    last_location: LocationPoint
+
+
+class RoutePage(BaseModel):
+    trip_id: str
+    offset: int
+    total: int
+    points: List[LocationPoint]
+    next_offset: Optional[int] = None
 
 
 # ==================== EMERGENCY SCHEMAS ====================
@@ -230,11 +337,41 @@ class EmergencyResponse(BaseModel):
     resolved_at: Optional[datetime] = None
     resolution_notes: Optional[str] = None
     created_at: datetime
+    distance_km: Optional[float] = None  # Set by proximity searches
     
     class Config:
         from_attributes = True
 
 
+class EmergencyPolygonQuery(BaseModel):
+    coordinates: List[List[float]]  # Polygon ring as [longitude, latitude] pairs
+    statuses: List[EmergencyStatus] = [EmergencyStatus.ACTIVE]
+    limit: int = 100
+
+
+# ==================== FLEET SCHEMAS ====================
+class FleetPosition(BaseModel):
+    user_id: str
+    trip_id: str
+    vehicle_type: Optional[VehicleType] = None
+    latitude: float
+    longitude: float
+    updated_at: Optional[datetime] = None
+
+
+class FleetCluster(BaseModel):
+    latitude: float
+    longitude: float
+    count: int
+
+
+class FleetLiveResponse(BaseModel):
+    total: int  # Drivers in view (approximate when clustered)
+    clustered: bool
+    positions: List[FleetPosition] = []
+    clusters: List[FleetCluster] = []
+
+
 # ==================== DASHBOARD SCHEMAS ====================
 class DashboardStats(BaseModel):
     total_trips: int
@@ -0,0 +1,117 @@
+"""Rebuild the daily trip rollups from the trips collection.
+
+Usage:
+    python -m app.scripts.backfill_daily_rollups [--user-id ID]
+
+Existing rollup rows in scope are replaced by a full recount of finished
+trips (completed or emergency), grouped by user, UTC day and hour started.
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+from pymongo import InsertOne
+from app.config.database import db
+from app.schemas.pydantic_models import TripStatus
+from app.utils.daily_rollups import ROLLUP_COLLECTION, ROLLUP_FIELDS, empty_totals, rollup_id
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+async def backfill_daily_rollups(user_id: str = None) -> dict:
+    """Recount daily rollups for one user or every user"""
+    trips_collection = db.get_collection("trips")
+    rollups_collection = db.get_collection(ROLLUP_COLLECTION)
+    
+    match = {
+        "status": {"$in": [TripStatus.COMPLETED.value, TripStatus.EMERGENCY.value]},
+        "started_at": {"$ne": None}
+    }
+    if user_id:
+        match["user_id"] = user_id
+    
+    # One group per user, day and hour, sorted so each day's hours are adjacent
+    cursor = trips_collection.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$started_at"}},
+                "hour": {"$hour": "$started_at"}
+            },
+            "trips": {"$sum": 1},
+            "completed": {
+                "$sum": {"$cond": [{"$eq": ["$status", TripStatus.COMPLETED.value]}, 1, 0]}
+            },
+            "emergencies": {
+                "$sum": {"$cond": [{"$eq": ["$status", TripStatus.EMERGENCY.value]}, 1, 0]}
+            },
+            "distance_km": {"$sum": "$distance_km"},
+            "duration_minutes": {"$sum": "$duration_minutes"}
+        }},
+        {"$sort": {"_id.user_id": 1, "_id.day": 1}}
+    ], allowDiskUse=True)
+    
+    await rollups_collection.delete_many({"user_id": user_id} if user_id else {})
+    
+    rows = 0
+    batch = []
+    current = None
+    
+    async def flush():
+        nonlocal batch, rows
+        if batch:
+            await rollups_collection.bulk_write(batch, ordered=False)
+            rows += len(batch)
+            batch = []
+    
+    async for group in cursor:
+        key = group["_id"]
+        if current is None or (current["user_id"], current["day_key"]) != (key["user_id"], key["day"]):
+            if current is not None:
+                current.pop("day_key")
+                batch.append(InsertOne(current))
+                if len(batch) >= BATCH_SIZE:
+                    await flush()
+            day = datetime.strptime(key["day"], "%Y-%m-%d")
+            current = {
+                "_id": rollup_id(key["user_id"], day.date()),
+                "user_id": key["user_id"],
+                "day": day,
+                "day_key": key["day"],
+                **empty_totals(),
+                "hours": {}
+            }
+        
+        counters = {field: group[field] for field in ROLLUP_FIELDS}
+        current["hours"][f"{key['hour']:02d}"] = counters
+        for field in ROLLUP_FIELDS:
+            current[field] += counters[field]
+    
+    if current is not None:
+        current.pop("day_key")
+        batch.append(InsertOne(current))
+    await flush()
+    
+    return {"rows": rows}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild daily trip rollups")
+    parser.add_argument("--user-id", help="Only rebuild this user's rollups")
+    args = parser.parse_args()
+    
+    await db.connect()
+    try:
+        result = await backfill_daily_rollups(args.user_id)
+        logger.info("Wrote %(rows)d daily rollup rows", result)
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(main())
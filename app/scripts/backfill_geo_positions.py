@@ -0,0 +1,63 @@
+"""Add GeoJSON positions to emergencies and trips stored before they existed.
+
+Usage:
+    python -m app.scripts.backfill_geo_positions
+
+Sets emergencies.position from the emergency location, and trips.last_position
+from the trip's last location (or its origin), wherever they are missing.
+"""
+import asyncio
+import logging
+from pymongo import UpdateOne
+from app.config.database import db
+from app.utils.geo import geo_point, valid_coordinate
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+async def backfill_collection(collection_name: str, field: str, source_fields: list) -> int:
+    """Set a GeoJSON field from the first present source location; returns documents updated"""
+    collection = db.get_collection(collection_name)
+    cursor = collection.find(
+        {field: {"$exists": False}},
+        projection={source: 1 for source in source_fields}
+    )
+    
+    updated = 0
+    batch = []
+    async for doc in cursor:
+        location = next((doc[source] for source in source_fields if doc.get(source)), None)
+        if location is None or not valid_coordinate(location["latitude"], location["longitude"]):
+            continue
+        
+        batch.append(UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {field: geo_point(location["latitude"], location["longitude"])}}
+        ))
+        if len(batch) >= BATCH_SIZE:
+            await collection.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    return updated
+
+
+async def main() -> None:
+    await db.connect()
+    try:
+        emergencies = await backfill_collection("emergencies", "position", ["location"])
+        trips = await backfill_collection("trips", "last_position", ["last_location", "origin"])
+        logger.info("Added positions to %d emergencies and %d trips", emergencies, trips)
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(main())
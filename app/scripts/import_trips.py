@@ -0,0 +1,78 @@
+"""Import historical trips from GPX or CSV files.
+
+Usage:
+    python -m app.scripts.import_trips --user-email EMAIL [--vehicle-type car]
+        [--dry-run] FILE_OR_DIRECTORY [...]
+
+Directories are searched recursively for .gpx and .csv files. Files are
+parsed in a process pool and trips written in bulk (see
+app.utils.trip_import); trips imported by an earlier run are skipped.
+"""
+import argparse
+import asyncio
+import logging
+from pathlib import Path
+from typing import List
+from app.config.database import db
+from app.schemas.pydantic_models import VehicleType
+from app.utils.trip_import import import_trip_files, shutdown_parse_pool
+
+
+logger = logging.getLogger(__name__)
+
+IMPORT_SUFFIXES = (".gpx", ".csv")
+
+
+def collect_files(paths: List[str]) -> List[Path]:
+    """Import files named directly or found under directories"""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(
+                candidate for candidate in path.rglob("*")
+                if candidate.suffix.lower() in IMPORT_SUFFIXES
+            ))
+        else:
+            files.append(path)
+    return files
+
+
+async def run_import(user_email: str, vehicle_type: str, paths: List[str], dry_run: bool) -> dict:
+    """Import files for the user with the given email"""
+    users_collection = db.get_collection("users")
+    user = await users_collection.find_one({"email": user_email}, projection={"_id": 1})
+    if user is None:
+        raise SystemExit(f"No user with email {user_email}")
+    
+    # Workers read the files themselves
+    files = [(str(path), path) for path in collect_files(paths)]
+    return await import_trip_files(files, str(user["_id"]), vehicle_type, dry_run)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Import historical trips from GPX or CSV files")
+    parser.add_argument("paths", nargs="+", help="GPX/CSV files or directories containing them")
+    parser.add_argument("--user-email", required=True, help="Owner of the imported trips")
+    parser.add_argument("--vehicle-type", default=VehicleType.CAR.value,
+                        choices=[vehicle.value for vehicle in VehicleType])
+    parser.add_argument("--dry-run", action="store_true", help="Parse and validate without writing")
+    args = parser.parse_args()
+    
+    await db.connect()
+    try:
+        result = await run_import(args.user_email, args.vehicle_type, args.paths, args.dry_run)
+        for file_report in result["files"]:
+            for error in file_report["errors"]:
+                logger.warning(error)
+        logger.info(
+            "Imported %(trips_imported)d trips (%(points_imported)d points), "
+            "skipped %(duplicates_skipped)d already imported", result
+        )
+    finally:
+        shutdown_parse_pool()
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(main())
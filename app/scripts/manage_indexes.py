@@ -0,0 +1,66 @@
+"""Build and inspect the indexes declared in app.config.indexes.
+
+Usage:
+    python -m app.scripts.manage_indexes [--apply] [--drop-undeclared]
+
+Without options, reports declared indexes that are missing (and the
+duplicate keys preventing missing unique indexes from being built) and
+existing ones that are undeclared or have not served any operation since
+the server started. --apply builds the declared indexes even if the current
+index schema version is already recorded; --drop-undeclared drops the
+indexes the report lists as undeclared (superseded indexes, for instance).
+"""
+import argparse
+import asyncio
+import logging
+from app.config.database import db
+from app.config.indexes import INDEX_SCHEMA_VERSION, applied_version, ensure_indexes, index_report
+
+
+logger = logging.getLogger(__name__)
+
+
+async def drop_undeclared(report: dict) -> int:
+    """Drop the indexes a report lists as undeclared"""
+    dropped = 0
+    for collection, entry in report.items():
+        for name in entry["undeclared"]:
+            await db.get_collection(collection).drop_index(name)
+            logger.info("Dropped %s.%s", collection, name)
+            dropped += 1
+    return dropped
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Build and inspect MongoDB indexes")
+    parser.add_argument("--apply", action="store_true", help="Build the declared indexes now")
+    parser.add_argument("--drop-undeclared", action="store_true", help="Drop indexes that are not declared")
+    args = parser.parse_args()
+    
+    await db.connect()
+    try:
+        database = db.get_db()
+        logger.info("Index schema version: declared %d, applied %d",
+                    INDEX_SCHEMA_VERSION, await applied_version(database))
+        
+        if args.apply:
+            await ensure_indexes(database, force=True)
+        
+        report = await index_report(database)
+        for collection, entry in report.items():
+            for kind in ("missing", "undeclared", "unused"):
+                if entry[kind]:
+                    logger.info("%s %s: %s", collection, kind, ", ".join(entry[kind]))
+            for duplicate in entry["duplicates"]:
+                logger.warning("%s.%s duplicate key %s in %d documents",
+                               collection, duplicate["index"], duplicate["key"], duplicate["count"])
+        
+        if args.drop_undeclared:
+            logger.info("Dropped %d undeclared indexes", await drop_undeclared(report))
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(main())
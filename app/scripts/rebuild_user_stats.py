@@ -0,0 +1,73 @@
+"""Rebuild per-user dashboard statistics from the raw collections.
+
+Usage:
+    python -m app.scripts.rebuild_user_stats [--user-id ID] [--dry-run]
+
+Reports every user whose stored statistics had drifted from a full recount.
+"""
+import argparse
+import asyncio
+import logging
+from app.config.database import db
+from app.utils.user_stats import (
+    STATS_COLLECTION,
+    STAT_FIELDS,
+    compute_user_stats,
+    rebuild_user_stats
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def stats_differ(stored: dict, computed: dict) -> bool:
+    """Whether stored stats disagree with a fresh recount"""
+    return any(
+        abs((stored.get(field) or 0) - computed[field]) > 1e-6
+        for field in STAT_FIELDS
+    )
+
+
+async def rebuild_all_user_stats(user_id: str = None, dry_run: bool = False) -> dict:
+    """Recompute statistics for one user or every user"""
+    users_collection = db.get_collection("users")
+    stats_collection = db.get_collection(STATS_COLLECTION)
+    
+    if user_id:
+        user_ids = [user_id]
+    else:
+        user_ids = [str(user["_id"]) async for user in users_collection.find({}, projection={"_id": 1})]
+    
+    drifted = 0
+    for current_id in user_ids:
+        stored = await stats_collection.find_one({"_id": current_id})
+        computed = await compute_user_stats(current_id)
+        
+        if stored is not None and stats_differ(stored, computed):
+            drifted += 1
+            logger.info("Stats drift for user %s: %s -> %s", current_id,
+                        {field: stored.get(field) for field in STAT_FIELDS}, computed)
+        
+        if not dry_run:
+            await rebuild_user_stats(current_id)
+    
+    return {"users": len(user_ids), "drifted": drifted}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild per-user dashboard statistics")
+    parser.add_argument("--user-id", help="Only rebuild this user's statistics")
+    parser.add_argument("--dry-run", action="store_true", help="Report drift without writing")
+    args = parser.parse_args()
+    
+    await db.connect()
+    try:
+        result = await rebuild_all_user_stats(args.user_id, args.dry_run)
+        logger.info("Checked %(users)d users, %(drifted)d had drifted", result)
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(main())
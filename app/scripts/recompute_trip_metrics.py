@@ -0,0 +1,88 @@
+"""Recompute stored trip distances from their recorded routes.
+
+Usage:
+    python -m app.scripts.recompute_trip_metrics [--user-id ID] [--batch-size N] [--dry-run]
+
+Trips are processed in batches: the routes of a whole batch are loaded with
+one query and their distances computed over a single NumPy array.
+"""
+import argparse
+import asyncio
+import logging
+from pymongo import UpdateOne
+from app.config.database import db
+from app.schemas.pydantic_models import TripStatus
+from app.utils import route_store
+from app.utils.route_geometry import compute_path_distances_km, trip_path
+
+
+logger = logging.getLogger(__name__)
+
+
+async def recompute_batch(trip_docs: list, dry_run: bool) -> int:
+    """Recompute the distance of a batch of trips, returning how many changed"""
+    routes = await route_store.load_routes(trip_docs)
+    paths = [trip_path(trip, routes[str(trip["_id"])]) for trip in trip_docs]
+    distances = compute_path_distances_km(paths)
+    
+    updates = [
+        UpdateOne({"_id": trip["_id"]}, {"$set": {"distance_km": float(distance)}})
+        for trip, distance in zip(trip_docs, distances)
+        if abs(trip.get("distance_km", 0) - distance) > 1e-9
+    ]
+    
+    if updates and not dry_run:
+        trips_collection = db.get_collection("trips")
+        await trips_collection.bulk_write(updates, ordered=False)
+    
+    return len(updates)
+
+
+async def recompute_trip_metrics(user_id: str = None, batch_size: int = 500, dry_run: bool = False) -> dict:
+    """Recompute distances of all finished trips, optionally for a single user"""
+    trips_collection = db.get_collection("trips")
+    
+    query = {"status": {"$in": [TripStatus.COMPLETED.value, TripStatus.EMERGENCY.value]}}
+    if user_id:
+        query["user_id"] = user_id
+    
+    cursor = trips_collection.find(
+        query,
+        projection={"origin": 1, "destination": 1, "route": 1, "point_count": 1, "distance_km": 1},
+        batch_size=batch_size
+    )
+    
+    scanned = changed = 0
+    batch = []
+    async for trip_doc in cursor:
+        batch.append(trip_doc)
+        if len(batch) >= batch_size:
+            changed += await recompute_batch(batch, dry_run)
+            scanned += len(batch)
+            batch = []
+    
+    if batch:
+        changed += await recompute_batch(batch, dry_run)
+        scanned += len(batch)
+    
+    return {"scanned": scanned, "changed": changed}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Recompute trip distances from recorded routes")
+    parser.add_argument("--user-id", help="Only recompute trips of this user")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without writing")
+    args = parser.parse_args()
+    
+    await db.connect()
+    try:
+        result = await recompute_trip_metrics(args.user_id, args.batch_size, args.dry_run)
+        logger.info("Scanned %(scanned)d trips, %(changed)d distances updated", result)
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(main())
@@ -0,0 +1,42 @@
+"""Set the role of a user, e.g. to grant safety desk staff dispatcher access.
+
+Usage:
+    python -m app.scripts.set_user_role EMAIL {driver,dispatcher}
+
+Running API processes pick the change up once their cached copy of the
+user expires (USER_CACHE_TTL_SECONDS).
+"""
+import argparse
+import asyncio
+import logging
+from app.config.database import db
+from app.schemas.pydantic_models import UserRole
+
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Set the role of a user")
+    parser.add_argument("email", help="Email of the user")
+    parser.add_argument("role", choices=[role.value for role in UserRole])
+    args = parser.parse_args()
+    
+    await db.connect()
+    try:
+        users_collection = db.get_collection("users")
+        result = await users_collection.update_one(
+            {"email": args.email},
+            {"$set": {"role": args.role}, "$inc": {"profile_version": 1}}
+        )
+        if result.matched_count == 0:
+            logger.error("No user with email %s", args.email)
+        else:
+            logger.info("Set role of %s to %s", args.email, args.role)
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(main())
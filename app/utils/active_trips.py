@@ -0,0 +1,136 @@
+from typing import Dict, Optional
+from app.config.database import db
+from app.config.settings import settings
+from app.schemas.pydantic_models import TripStatus
+from app.utils.fleet_grid import LivePositionGrid
+
+
+# Fields of an in-progress trip kept in the registry: enough to attach an
+# emergency to it and to extend its running totals without reading it
+ACTIVE_TRIP_PROJECTION = {
+    "user_id": 1,
+    "status": 1,
+    "vehicle_type": 1,
+    "origin": 1,
+    "started_at": 1,
+    "point_count": 1,
+    "last_location": 1,
+    "distance_km": 1,
+    "duration_minutes": 1,
+    "route": {"$slice": -1}
+}
+
+
+def active_trip_entry(trip_doc: dict) -> dict:
+    """Build a registry entry from a trip document"""
+    entry = {field: trip_doc.get(field) for field in ACTIVE_TRIP_PROJECTION if field != "route"}
+    entry["_id"] = trip_doc["_id"]
+    
+    # Trips created before last_location was tracked embed their route
+    if entry["last_location"] is None and trip_doc.get("route"):
+        entry["last_location"] = trip_doc["route"][-1]
+    return entry
+
+
+def live_position(entry: dict) -> Optional[dict]:
+    """Fleet map position of an active trip: its last point, or its origin"""
+    location = entry.get("last_location") or entry.get("origin")
+    if location is None:
+        return None
+    
+    return {
+        "user_id": entry["user_id"],
+        "trip_id": str(entry["_id"]),
+        "vehicle_type": entry.get("vehicle_type"),
+        "latitude": location["latitude"],
+        "longitude": location["longitude"],
+        "updated_at": location.get("timestamp")
+    }
+
+
+class ActiveTripRegistry:
+    """In-progress trip of each user, kept in process.
+    
+    Loaded at startup and kept current by the trip write paths. A user
+    missing from the registry is looked up in MongoDB, so trips started by
+    another process are still found; an entry for a trip that another
+    process finished is dropped as soon as a conditional write on it fails.
+    
+    The current position of every registered trip is also kept in a spatial
+    grid (self.grid) for the fleet map.
+    """
+    
+    def __init__(self):
+        self._trips: Dict[str, dict] = {}
+        self.grid = LivePositionGrid(settings.FLEET_GRID_CELL_DEGREES)
+        self.hits = 0
+        self.misses = 0
+    
+    def _store(self, user_id: str, entry: dict) -> None:
+        self._trips[user_id] = entry
+        position = live_position(entry)
+        if position is not None:
+            self.grid.move(user_id, position)
+    
+    async def load(self) -> None:
+        """Load every in-progress trip"""
+        trips_collection = db.get_collection("trips")
+        cursor = trips_collection.find(
+            {"status": TripStatus.IN_PROGRESS.value},
+            projection=ACTIVE_TRIP_PROJECTION
+        )
+        self._trips = {}
+        self.grid.clear()
+        async for trip in cursor:
+            self._store(trip["user_id"], active_trip_entry(trip))
+    
+    async def get(self, user_id: str) -> Optional[dict]:
+        """Get a user's active trip entry, from MongoDB on a miss"""
+        entry = self._trips.get(user_id)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        
+        self.misses += 1
+        trips_collection = db.get_collection("trips")
+        trip_doc = await trips_collection.find_one(
+            {"user_id": user_id, "status": TripStatus.IN_PROGRESS.value},
+            projection=ACTIVE_TRIP_PROJECTION
+        )
+        if trip_doc is None:
+            return None
+        
+        entry = active_trip_entry(trip_doc)
+        self._store(user_id, entry)
+        return entry
+    
+    def peek(self, user_id: str, trip_id: str) -> Optional[dict]:
+        """Get the registry entry of a trip without falling back to MongoDB"""
+        entry = self._trips.get(user_id)
+        if entry is not None and str(entry["_id"]) == trip_id:
+            return entry
+        return None
+    
+    def add(self, trip_doc: dict) -> None:
+        """Register a trip that was just started"""
+        self._store(trip_doc["user_id"], active_trip_entry(trip_doc))
+    
+    def advance(self, user_id: str, trip_id: str, **fields) -> None:
+        """Record new running totals, unless a later append already did"""
+        entry = self.peek(user_id, trip_id)
+        if entry is not None and fields.get("point_count", 0) > (entry["point_count"] or 0):
+            entry.update(fields)
+            self._store(user_id, entry)
+    
+    def discard(self, user_id: str, trip_id: str) -> None:
+        """Drop a trip that is no longer in progress"""
+        if self.peek(user_id, trip_id) is not None:
+            del self._trips[user_id]
+            self.grid.remove(user_id)
+    
+    def stats(self) -> dict:
+        """Registry size and lookup counters"""
+        return {"size": len(self._trips), "hits": self.hits, "misses": self.misses}
+
+
+active_trips = ActiveTripRegistry()
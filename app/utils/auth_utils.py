@@ -1,7 +1,11 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from typing import Optional
+from typing import Callable, Optional
 from app.config.settings import settings
 from app.schemas.pydantic_models import TokenData
 
@@ -20,6 +24,85 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+class PasswordHasher:
+    """Runs bcrypt hashing and verification on a bounded thread pool.
+    
+    bcrypt releases the GIL, so a few threads keep the event loop free while
+    at most max_workers hashes run at once; further requests wait in the
+    executor queue.
+    """
+    
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="password-hasher"
+            )
+        return self._executor
+    
+    def _run_timed(self, func: Callable, submitted_at: float, *args):
+        """Run func in a worker thread, recording how long it waited to start"""
+        waited = time.monotonic() - submitted_at
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+    
+    async def _run(self, func: Callable, *args):
+        with self._lock:
+            self.queued += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), self._run_timed, func, time.monotonic(), *args
+        )
+    
+    async def hash(self, password: str) -> str:
+        """Hash a password off the event loop"""
+        return await self._run(get_password_hash, password)
+    
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a password against its hash off the event loop"""
+        return await self._run(verify_password, plain_password, hashed_password)
+    
+    def shutdown(self) -> None:
+        """Stop the worker threads"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    def stats(self) -> dict:
+        """Concurrency and queueing metrics"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "avg_wait_ms": round(self.total_wait_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 2)
+            }
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -40,8 +123,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-def decode_access_token(token: str) -> Optional[TokenData]:
-    """Decode and validate a JWT access token"""
+def _decode_token(token: str, token_type: str) -> Optional[TokenData]:
+    """Decode and validate a JWT of the given type ("access" or "refresh")"""
     try:
         payload = jwt.decode(
             token, 
@@ -51,15 +134,32 @@ def decode_access_token(token: str) -> Optional[TokenData]:
         user_id: str = payload.get("sub")
         email: str = payload.get("email")
         
-        if user_id is None:
+        # Tokens issued before typed tokens existed are access tokens
+        if user_id is None or payload.get("typ", "access") != token_type:
             return None
         
-        return TokenData(user_id=user_id, email=email)
+        return TokenData(
+            user_id=user_id,
+            email=email,
+            full_name=payload.get("name"),
+            vehicle_preference=payload.get("vp"),
+            profile_version=payload.get("pv")
+        )
         
     except JWTError:
         return None
 
 
+def decode_access_token(token: str) -> Optional[TokenData]:
+    """Decode and validate a JWT access token"""
+    return _decode_token(token, "access")
+
+
+def decode_refresh_token(token: str) -> Optional[TokenData]:
+    """Decode and validate a JWT refresh token"""
+    return _decode_token(token, "refresh")
+
+
 def create_user_token(user_id: str, email: str) -> str:
     """Create a token for a specific user"""
     expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -67,3 +167,28 @@ def create_user_token(user_id: str, email: str) -> str:
         data={"sub": user_id, "email": email},
         expires_delta=expires
     )
+
+
+def create_profile_token(user_doc: dict) -> str:
+    """Create a short-lived access token carrying the user's profile claims"""
+    expires = timedelta(minutes=settings.STATELESS_ACCESS_TOKEN_EXPIRE_MINUTES)
+    return create_access_token(
+        data={
+            "sub": user_doc["id"],
+            "email": user_doc["email"],
+            "name": user_doc.get("full_name"),
+            "vp": user_doc.get("vehicle_preference"),
+            "pv": user_doc.get("profile_version", 0),
+            "typ": "access"
+        },
+        expires_delta=expires
+    )
+
+
+def create_refresh_token(user_id: str, profile_version: int) -> str:
+    """Create a long-lived refresh token"""
+    expires = timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    return create_access_token(
+        data={"sub": user_id, "pv": profile_version, "typ": "refresh"},
+        expires_delta=expires
+    )
@@ -0,0 +1,103 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional
+from zoneinfo import ZoneInfo
+from app.config.database import db
+from app.schemas.pydantic_models import TripStatus
+
+
+# Per-user daily rollups of finished trips, attributed to the UTC day and hour
+# the trip started:
+#   {"_id": "<user_id>:<YYYY-MM-DD>", "user_id", "day",
+#    "trips", "completed", "emergencies", "distance_km", "duration_minutes",
+#    "hours": {"00".."23": {same counters}}}
+# The hourly breakdown lets reads regroup rows into days of any whole-hour
+# time zone; offsets with minutes are attributed by the hour the trip started.
+ROLLUP_COLLECTION = "trip_daily_rollups"
+
+ROLLUP_FIELDS = ("trips", "completed", "emergencies", "distance_km", "duration_minutes")
+
+
+def empty_totals() -> dict:
+    return {field: 0 for field in ROLLUP_FIELDS}
+
+
+def rollup_id(user_id: str, day: date) -> str:
+    return f"{user_id}:{day.isoformat()}"
+
+
+async def increment_rollup(user_id: str, started_at: Optional[datetime], **deltas) -> None:
+    """Add counters to the rollup row of the UTC day and hour a trip started"""
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas or started_at is None:
+        return
+    
+    day = started_at.date()
+    hour = f"{started_at.hour:02d}"
+    increments = {}
+    for field, value in deltas.items():
+        increments[field] = value
+        increments[f"hours.{hour}.{field}"] = value
+    
+    rollups_collection = db.get_collection(ROLLUP_COLLECTION)
+    await rollups_collection.update_one(
+        {"_id": rollup_id(user_id, day)},
+        {
+            "$inc": increments,
+            "$setOnInsert": {
+                "user_id": user_id,
+                "day": datetime(day.year, day.month, day.day)
+            }
+        },
+        upsert=True
+    )
+
+
+def emergency_rollup_deltas(trip_doc: dict) -> dict:
+    """Rollup changes when a trip leaves its current status for emergency"""
+    if trip_doc.get("status") == TripStatus.IN_PROGRESS.value:
+        return {
+            "trips": 1,
+            "emergencies": 1,
+            "distance_km": trip_doc.get("distance_km", 0),
+            "duration_minutes": trip_doc.get("duration_minutes", 0)
+        }
+    if trip_doc.get("status") == TripStatus.COMPLETED.value:
+        return {"completed": -1, "emergencies": 1}
+    return {}
+
+
+def get_time_zone(name: str) -> ZoneInfo:
+    """Resolve a time zone name, raising ValueError if unknown"""
+    try:
+        return ZoneInfo(name)
+    except Exception:
+        raise ValueError(f"Unknown time zone: {name}")
+
+
+async def daily_totals(user_id: str, start: date, end: date, tz: ZoneInfo) -> Dict[date, dict]:
+    """Totals per local day in [start, end] for a time zone, from rollup rows"""
+    # UTC rows overlapping the local range
+    utc_start = datetime.combine(start, datetime.min.time(), tz).astimezone(timezone.utc)
+    utc_end = datetime.combine(end + timedelta(days=1), datetime.min.time(), tz).astimezone(timezone.utc)
+    
+    days = {start + timedelta(days=offset): empty_totals() for offset in range((end - start).days + 1)}
+    
+    rollups_collection = db.get_collection(ROLLUP_COLLECTION)
+    cursor = rollups_collection.find({
+        "user_id": user_id,
+        "day": {
+            "$gte": datetime(utc_start.year, utc_start.month, utc_start.day),
+            "$lt": utc_end.replace(tzinfo=None)
+        }
+    })
+    
+    async for row in cursor:
+        for hour, counters in (row.get("hours") or {}).items():
+            slot = (row["day"] + timedelta(hours=int(hour))).replace(tzinfo=timezone.utc)
+            local_day = slot.astimezone(tz).date()
+            if local_day in days:
+                totals = days[local_day]
+                for field in ROLLUP_FIELDS:
+                    totals[field] += counters.get(field, 0)
+    
+    return days
@@ -0,0 +1,106 @@
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from typing import AsyncIterator, Callable, List, Optional
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from app.config.settings import settings
+from app.schemas.pydantic_models import ExportFormat, UserResponse, UserRole
+
+
+# Exports walk a Motor cursor and send rows as they arrive, so memory use
+# does not depend on how much history is exported
+
+
+# Exported history is sorted oldest first
+EXPORT_SORT = [("created_at", 1), ("_id", 1)]
+
+
+def export_owner_query(current_user: UserResponse, user_id: Optional[str]) -> dict:
+    """Whose documents an export covers: the user's own, or any user's for dispatchers"""
+    if current_user.role != UserRole.DISPATCHER:
+        if user_id is not None and user_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Dispatcher role required"
+            )
+        return {"user_id": current_user.id}
+    
+    return {"user_id": user_id} if user_id is not None else {}
+
+
+def created_range(query: dict, start: Optional[date], end: Optional[date]) -> dict:
+    """Restrict a query to documents created on the given UTC days (both inclusive)"""
+    if start and end and start > end:
+        raise ValueError("from must not be after to")
+    
+    created_at = {}
+    if start:
+        created_at["$gte"] = datetime.combine(start, time.min)
+    if end:
+        created_at["$lt"] = datetime.combine(end + timedelta(days=1), time.min)
+    return {**query, "created_at": created_at} if created_at else query
+
+
+def csv_value(value) -> str:
+    """Cell text for a row value"""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def ndjson_chunks(cursor, to_row: Callable[[dict], dict]) -> AsyncIterator[str]:
+    """Rows as newline-delimited JSON"""
+    buffer = []
+    async for doc in cursor:
+        buffer.append(json.dumps(jsonable_encoder(to_row(doc))))
+        if len(buffer) >= settings.EXPORT_CHUNK_ROWS:
+            yield "\n".join(buffer) + "\n"
+            buffer = []
+    if buffer:
+        yield "\n".join(buffer) + "\n"
+
+
+async def csv_chunks(cursor, columns: List[str], to_row: Callable[[dict], dict]) -> AsyncIterator[str]:
+    """Rows as CSV, with a header line"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    rows = 0
+    
+    async for doc in cursor:
+        row = to_row(doc)
+        writer.writerow([csv_value(row.get(column)) for column in columns])
+        rows += 1
+        if rows >= settings.EXPORT_CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    yield buffer.getvalue()
+
+
+def export_response(
+    cursor,
+    export_format: ExportFormat,
+    columns: List[str],
+    to_row: Callable[[dict], dict],
+    filename: str
+) -> StreamingResponse:
+    """Stream the documents of a cursor as an NDJSON or CSV download"""
+    if export_format == ExportFormat.CSV:
+        chunks = csv_chunks(cursor, columns, to_row)
+        media_type = "text/csv"
+    else:
+        chunks = ndjson_chunks(cursor, to_row)
+        media_type = "application/x-ndjson"
+    
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format.value}"'}
+    )
@@ -0,0 +1,141 @@
+import math
+from typing import Dict, Iterator, List, Tuple
+
+
+class LivePositionGrid:
+    """Live positions indexed by a uniform latitude/longitude grid.
+    
+    Each cell keeps its members plus running coordinate sums, so counting or
+    clustering the positions in a viewport only visits the cells it covers
+    (or the occupied cells, when those are fewer).
+    """
+    
+    def __init__(self, cell_degrees: float):
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[Tuple[int, int], dict] = {}
+        self._where: Dict[str, Tuple[int, int]] = {}
+    
+    def __len__(self) -> int:
+        return len(self._where)
+    
+    def cell_of(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        """Grid cell containing a coordinate"""
+        return (
+            math.floor(latitude / self.cell_degrees),
+            math.floor(longitude / self.cell_degrees)
+        )
+    
+    def move(self, key: str, position: dict) -> None:
+        """Insert or move a position; it must have latitude and longitude"""
+        self.remove(key)
+        
+        cell_key = self.cell_of(position["latitude"], position["longitude"])
+        cell = self._cells.setdefault(cell_key, {"members": {}, "latitude": 0.0, "longitude": 0.0})
+        cell["members"][key] = position
+        cell["latitude"] += position["latitude"]
+        cell["longitude"] += position["longitude"]
+        self._where[key] = cell_key
+    
+    def remove(self, key: str) -> None:
+        """Drop a position if present"""
+        cell_key = self._where.pop(key, None)
+        if cell_key is None:
+            return
+        
+        cell = self._cells[cell_key]
+        position = cell["members"].pop(key)
+        if not cell["members"]:
+            del self._cells[cell_key]
+            return
+        cell["latitude"] -= position["latitude"]
+        cell["longitude"] -= position["longitude"]
+    
+    def clear(self) -> None:
+        """Drop every position"""
+        self._cells.clear()
+        self._where.clear()
+    
+    def cells_in(
+        self,
+        min_latitude: float,
+        min_longitude: float,
+        max_latitude: float,
+        max_longitude: float
+    ) -> Iterator[Tuple[Tuple[int, int], dict]]:
+        """Occupied cells overlapping a bounding box"""
+        min_row, min_col = self.cell_of(min_latitude, min_longitude)
+        max_row, max_col = self.cell_of(max_latitude, max_longitude)
+        covered = (max_row - min_row + 1) * (max_col - min_col + 1)
+        
+        if covered > len(self._cells):
+            for cell_key, cell in self._cells.items():
+                if min_row <= cell_key[0] <= max_row and min_col <= cell_key[1] <= max_col:
+                    yield cell_key, cell
+            return
+        
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                cell = self._cells.get((row, col))
+                if cell is not None:
+                    yield (row, col), cell
+    
+    def count_in(self, *bbox: float) -> int:
+        """Approximate number of positions in a bounding box (whole border cells)"""
+        return sum(len(cell["members"]) for _, cell in self.cells_in(*bbox))
+    
+    def positions_in(
+        self,
+        min_latitude: float,
+        min_longitude: float,
+        max_latitude: float,
+        max_longitude: float,
+        limit: int
+    ) -> List[dict]:
+        """Positions inside a bounding box, at most limit of them"""
+        result = []
+        for _, cell in self.cells_in(min_latitude, min_longitude, max_latitude, max_longitude):
+            for position in cell["members"].values():
+                if (min_latitude <= position["latitude"] <= max_latitude
+                        and min_longitude <= position["longitude"] <= max_longitude):
+                    result.append(position)
+                    if len(result) >= limit:
+                        return result
+        return result
+    
+    def clusters_in(
+        self,
+        min_latitude: float,
+        min_longitude: float,
+        max_latitude: float,
+        max_longitude: float,
+        divisions: int
+    ) -> List[dict]:
+        """Cluster the positions in a bounding box on a divisions x divisions grid
+        
+        Grid cells are merged whole into clusters, so border cells may
+        contribute positions just outside the box.
+        """
+        lat_step = (max_latitude - min_latitude) / divisions
+        lng_step = (max_longitude - min_longitude) / divisions
+        clusters: Dict[Tuple[int, int], dict] = {}
+        
+        for (row, col), cell in self.cells_in(min_latitude, min_longitude, max_latitude, max_longitude):
+            center_lat = (row + 0.5) * self.cell_degrees
+            center_lng = (col + 0.5) * self.cell_degrees
+            cluster_key = (
+                min(max(int((center_lat - min_latitude) / lat_step), 0), divisions - 1),
+                min(max(int((center_lng - min_longitude) / lng_step), 0), divisions - 1)
+            )
+            cluster = clusters.setdefault(cluster_key, {"count": 0, "latitude": 0.0, "longitude": 0.0})
+            cluster["count"] += len(cell["members"])
+            cluster["latitude"] += cell["latitude"]
+            cluster["longitude"] += cell["longitude"]
+        
+        return [
+            {
+                "latitude": cluster["latitude"] / cluster["count"],
+                "longitude": cluster["longitude"] / cluster["count"],
+                "count": cluster["count"]
+            }
+            for cluster in clusters.values()
+        ]
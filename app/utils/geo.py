@@ -0,0 +1,55 @@
+from typing import List
+
+
+# Positions are stored as GeoJSON next to the plain latitude/longitude
+# fields, so they can be served by 2dsphere indexes:
+#   emergencies.position     - where the emergency was raised
+#   trips.last_position      - last known position of a trip
+
+
+def valid_coordinate(latitude: float, longitude: float) -> bool:
+    """Whether a latitude/longitude pair is on the globe"""
+    return -90 <= latitude <= 90 and -180 <= longitude <= 180
+
+
+def geo_point(latitude: float, longitude: float) -> dict:
+    """GeoJSON point for a coordinate (GeoJSON puts longitude first)"""
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def bbox_polygon(
+    min_latitude: float,
+    min_longitude: float,
+    max_latitude: float,
+    max_longitude: float
+) -> dict:
+    """GeoJSON polygon for a bounding box, raising ValueError if invalid"""
+    if not (valid_coordinate(min_latitude, min_longitude) and valid_coordinate(max_latitude, max_longitude)):
+        raise ValueError("Bounding box coordinates are out of range")
+    if min_latitude >= max_latitude or min_longitude >= max_longitude:
+        raise ValueError("Bounding box minimums must be below its maximums")
+    
+    return {
+        "type": "Polygon",
+        "coordinates": [[
+            [min_longitude, min_latitude],
+            [max_longitude, min_latitude],
+            [max_longitude, max_latitude],
+            [min_longitude, max_latitude],
+            [min_longitude, min_latitude]
+        ]]
+    }
+
+
+def ring_polygon(ring: List[List[float]]) -> dict:
+    """GeoJSON polygon for a [longitude, latitude] ring, raising ValueError if invalid"""
+    if any(len(position) != 2 or not valid_coordinate(position[1], position[0]) for position in ring):
+        raise ValueError("Polygon positions must be [longitude, latitude] pairs on the globe")
+    
+    ring = [list(position) for position in ring]
+    if ring and ring[0] != ring[-1]:
+        ring.append(ring[0])
+    if len(ring) < 4:
+        raise ValueError("A polygon needs at least three distinct positions")
+    
+    return {"type": "Polygon", "coordinates": [ring]}
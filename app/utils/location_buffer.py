@@ -0,0 +1,210 @@
+import asyncio
+import logging
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from pymongo.errors import BulkWriteError
+from app.config.database import db
+from app.config.settings import settings
+from app.utils import route_store
+
+
+logger = logging.getLogger(__name__)
+
+# Durability modes: acknowledge points once their bulk write completed, or
+# as soon as they are queued (queued points are lost if the process dies,
+# and dropped points stay counted in their trip's totals, as the caller was
+# already answered)
+DURABILITY_FLUSH = "flush"
+DURABILITY_ENQUEUE = "enqueue"
+
+
+class LocationWriteBuffer:
+    """Write-behind buffer coalescing route point writes into bulk writes.
+    
+    Points from every trip are queued per (trip, bucket) and written with a
+    single unordered bulk_write every flush_interval_ms, or as soon as
+    max_points are queued. Queued points of the same bucket become a single
+    $push.
+    
+    Buckets whose write the server reports as failed are queued again and
+    retried after retry_interval_ms; after max_attempts, or on an error that
+    leaves the outcome unknown, their points are dropped, and callers
+    waiting on them get the write error.
+    """
+    
+    def __init__(
+        self,
+        flush_interval_ms: int,
+        max_points: int,
+        durability: str,
+        max_attempts: int = 3,
+        retry_interval_ms: int = 500
+    ):
+        if durability not in (DURABILITY_FLUSH, DURABILITY_ENQUEUE):
+            raise ValueError(f"Unknown location write durability: {durability}")
+        
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_points = max_points
+        self.durability = durability
+        self.max_attempts = max_attempts
+        self.retry_interval = retry_interval_ms / 1000
+        self._pending: Dict[Tuple[str, int], List[dict]] = {}
+        self._pending_points = 0
+        self._attempts: Dict[Tuple[str, int], int] = {}
+        # Callers waiting for their points, with the buckets they were queued in
+        self._waiters: List[Tuple[asyncio.Future, FrozenSet[Tuple[str, int]]]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.max_queue_depth = 0
+        self.flushes = 0
+        self.points_written = 0
+        self.retried_points = 0
+        self.failed_points = 0
+    
+    async def append(self, trip_id: str, first_index: int, points: List[dict]) -> None:
+        """Queue route points stored from a given route index
+        
+        With "flush" durability, raises the write error if the points could
+        not be written.
+        """
+        if not points:
+            return
+        
+        keys = []
+        for bucket, chunk in route_store.bucket_chunks(first_index, points):
+            self._pending.setdefault((trip_id, bucket), []).extend(chunk)
+            keys.append((trip_id, bucket))
+        self._pending_points += len(points)
+        self.max_queue_depth = max(self.max_queue_depth, self._pending_points)
+        
+        waiter = None
+        if self.durability == DURABILITY_FLUSH:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append((waiter, frozenset(keys)))
+        
+        if self._pending_points >= self.max_points:
+            # Full: write now, and make the caller wait for it (backpressure)
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.flush_interval, self._start_flush
+            )
+        
+        if waiter is not None:
+            await waiter
+    
+    def _start_flush(self) -> None:
+        self._timer = None
+        self._flush_task = asyncio.ensure_future(self.flush())
+    
+    async def flush(self) -> None:
+        """Write every queued point"""
+        async with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            
+            pending, self._pending = self._pending, {}
+            waiters, self._waiters = self._waiters, []
+            self._pending_points = 0
+            
+            if not pending:
+                return
+            
+            keys = list(pending)
+            updates = [
+                route_store.bucket_update(trip_id, bucket, pending[(trip_id, bucket)])
+                for trip_id, bucket in keys
+            ]
+            
+            # An unordered bulk write applies every update it can: only the
+            # ones the server reports as failed are known not to be applied,
+            # and can be retried ($push is not idempotent). Other errors (a
+            # network error once the driver's own retryable write failed too)
+            # leave the outcome unknown, so those points are not written again.
+            error = None
+            failed = set()
+            retryable = set()
+            try:
+                points_collection = db.get_collection(route_store.POINTS_COLLECTION)
+                await points_collection.bulk_write(updates, ordered=False)
+            except BulkWriteError as e:
+                error = e
+                failed = retryable = {keys[write_error["index"]] for write_error in e.details["writeErrors"]}
+            except Exception as e:
+                error = e
+                failed = set(keys)
+            
+            self.flushes += 1
+            dropped = set()
+            for key in keys:
+                count = len(pending[key])
+                if key not in failed:
+                    self._attempts.pop(key, None)
+                    self.points_written += count
+                    continue
+                
+                attempts = self._attempts.pop(key, 0) + 1
+                if key in retryable and attempts < self.max_attempts:
+                    self._pending[key] = pending[key] + self._pending.get(key, [])
+                    self._pending_points += count
+                    self._attempts[key] = attempts
+                    self.retried_points += count
+                else:
+                    dropped.add(key)
+                    self.failed_points += count
+            
+            if failed:
+                logger.error(
+                    "Failed to write route points of %d buckets (%d dropped): %s",
+                    len(failed), len(dropped), error
+                )
+            
+            for waiter, waiter_keys in waiters:
+                if waiter.done():
+                    continue
+                if waiter_keys & dropped:
+                    waiter.set_exception(error)
+                elif waiter_keys & failed:
+                    self._waiters.append((waiter, waiter_keys))
+                else:
+                    waiter.set_result(None)
+            
+            if self._pending and self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(
+                    self.retry_interval if failed else self.flush_interval, self._start_flush
+                )
+    
+    async def close(self) -> None:
+        """Write every queued point and stop the flush timer, on shutdown"""
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
+        
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending_points:
+            logger.error("Dropped %d route points still failing to write on shutdown", self._pending_points)
+    
+    def stats(self) -> dict:
+        """Queue depth and write counters"""
+        return {
+            "durability": self.durability,
+            "queue_depth": self._pending_points,
+            "queued_buckets": len(self._pending),
+            "max_queue_depth": self.max_queue_depth,
+            "flushes": self.flushes,
+            "points_written": self.points_written,
+            "retried_points": self.retried_points,
+            "failed_points": self.failed_points
+        }
+
+
+location_buffer = LocationWriteBuffer(
+    settings.LOCATION_FLUSH_INTERVAL_MS,
+    settings.LOCATION_FLUSH_MAX_POINTS,
+    settings.LOCATION_WRITE_DURABILITY,
+    settings.LOCATION_FLUSH_MAX_ATTEMPTS,
+    settings.LOCATION_FLUSH_RETRY_MS
+)
@@ -0,0 +1,52 @@
+import base64
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+
+
+# Listings are sorted newest first on (created_at, _id), so a page can
+# continue right after the last item of the previous one with an index
+# seek instead of skipping every earlier item
+PAGE_SORT = [("created_at", -1), ("_id", -1)]
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, item_id: str) -> str:
+    """Opaque cursor pointing after an item"""
+    raw = f"{created_at.isoformat()}|{item_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Item position of a cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, _, item_id = base64.urlsafe_b64decode(padded).decode().partition("|")
+        return datetime.fromisoformat(created_at), ObjectId(item_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def after_cursor(query: dict, cursor: Optional[str]) -> dict:
+    """Restrict a listing query to the items following a cursor"""
+    if not cursor:
+        return query
+    
+    created_at, item_id = decode_cursor(cursor)
+    return {
+        **query,
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": item_id}}
+        ]
+    }
+
+
+def next_page_headers(items: List[Any], limit: int) -> Dict[str, str]:
+    """X-Next-Cursor header for a full page of response models, none for the last page"""
+    if len(items) < limit:
+        return {}
+    
+    last = items[-1]
+    return {NEXT_CURSOR_HEADER: encode_cursor(last.created_at, last.id)}
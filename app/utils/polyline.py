@@ -0,0 +1,168 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Compact route encoding based on the Google encoded polyline algorithm:
+# each integer is delta-encoded against the previous one, zigzagged and
+# written as 5-bit chunks in printable ASCII.
+#
+# An encoded route is a dict with:
+#   format       "polyline6" (coordinates scaled by 1e6)
+#   count        number of points
+#   start_time   timestamp of the first point
+#   coordinates  encoded lat/lon pairs
+#   timestamps   encoded milliseconds since start_time
+#   columns      optional speed/accuracy/altitude, each {"values", "nulls"}
+#                where "nulls" encodes the indexes of points without a value
+ROUTE_FORMAT = "polyline6"
+COORDINATE_PRECISION = 6
+COLUMN_PRECISION = 2
+OPTIONAL_COLUMNS = ("speed", "accuracy", "altitude")
+
+
+def _encode_number(value: int) -> str:
+    """Encode a signed integer as polyline characters"""
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+
+def _decode_numbers(text: str) -> List[int]:
+    """Decode polyline characters into signed integers"""
+    numbers = []
+    index = 0
+    while index < len(text):
+        result = 0
+        shift = 0
+        while True:
+            byte = ord(text[index]) - 63
+            index += 1
+            result |= (byte & 0x1f) << shift
+            shift += 5
+            if byte < 0x20:
+                break
+        numbers.append(~(result >> 1) if result & 1 else result >> 1)
+    return numbers
+
+
+def encode_values(values: Iterable[int]) -> str:
+    """Delta-encode a sequence of integers"""
+    encoded = []
+    previous = 0
+    for value in values:
+        encoded.append(_encode_number(value - previous))
+        previous = value
+    return "".join(encoded)
+
+
+def decode_values(text: str) -> List[int]:
+    """Decode a delta-encoded sequence of integers"""
+    values = []
+    current = 0
+    for delta in _decode_numbers(text):
+        current += delta
+        values.append(current)
+    return values
+
+
+def encode_polyline(coordinates: Iterable[Tuple[float, float]], precision: int = COORDINATE_PRECISION) -> str:
+    """Encode (latitude, longitude) pairs as a polyline"""
+    factor = 10 ** precision
+    encoded = []
+    previous_lat = previous_lon = 0
+    for latitude, longitude in coordinates:
+        lat = round(latitude * factor)
+        lon = round(longitude * factor)
+        encoded.append(_encode_number(lat - previous_lat))
+        encoded.append(_encode_number(lon - previous_lon))
+        previous_lat, previous_lon = lat, lon
+    return "".join(encoded)
+
+
+def decode_polyline(text: str, precision: int = COORDINATE_PRECISION) -> List[Tuple[float, float]]:
+    """Decode a polyline into (latitude, longitude) pairs"""
+    factor = 10 ** precision
+    numbers = _decode_numbers(text)
+    coordinates = []
+    lat = lon = 0
+    for index in range(0, len(numbers) - 1, 2):
+        lat += numbers[index]
+        lon += numbers[index + 1]
+        coordinates.append((lat / factor, lon / factor))
+    return coordinates
+
+
+def _encode_column(values: List[Optional[float]]) -> Optional[Dict[str, Optional[str]]]:
+    """Encode an optional numeric column, or None if it has no values"""
+    present = [value for value in values if value is not None]
+    if not present:
+        return None
+    
+    factor = 10 ** COLUMN_PRECISION
+    nulls = [index for index, value in enumerate(values) if value is None]
+    return {
+        "values": encode_values(round(value * factor) for value in present),
+        "nulls": encode_values(nulls) if nulls else None
+    }
+
+
+def _decode_column(column: Dict[str, Optional[str]], count: int) -> List[Optional[float]]:
+    """Decode an optional numeric column back to one value per point"""
+    factor = 10 ** COLUMN_PRECISION
+    present = iter(value / factor for value in decode_values(column["values"]))
+    nulls = set(decode_values(column["nulls"])) if column.get("nulls") else set()
+    return [None if index in nulls else next(present) for index in range(count)]
+
+
+def encode_route(points: List[dict]) -> dict:
+    """Encode route points into the compact route representation"""
+    start_time = points[0]["timestamp"] if points else None
+    
+    columns = {}
+    for name in OPTIONAL_COLUMNS:
+        column = _encode_column([point.get(name) for point in points])
+        if column is not None:
+            columns[name] = column
+    
+    return {
+        "format": ROUTE_FORMAT,
+        "count": len(points),
+        "start_time": start_time,
+        "coordinates": encode_polyline((point["latitude"], point["longitude"]) for point in points),
+        "timestamps": encode_values(
+            round((point["timestamp"] - start_time).total_seconds() * 1000) for point in points
+        ),
+        "columns": columns
+    }
+
+
+def decode_route(encoded: dict) -> List[dict]:
+    """Decode the compact route representation into route points"""
+    count = encoded["count"]
+    if not count:
+        return []
+    
+    coordinates = decode_polyline(encoded["coordinates"])
+    offsets = decode_values(encoded["timestamps"])
+    start_time: datetime = encoded["start_time"]
+    columns = {
+        name: _decode_column(column, count)
+        for name, column in (encoded.get("columns") or {}).items()
+    }
+    
+    points = []
+    for index in range(count):
+        latitude, longitude = coordinates[index]
+        points.append({
+            "latitude": latitude,
+            "longitude": longitude,
+            "altitude": columns["altitude"][index] if "altitude" in columns else None,
+            "accuracy": columns["accuracy"][index] if "accuracy" in columns else None,
+            "speed": columns["speed"][index] if "speed" in columns else None,
+            "timestamp": start_time + timedelta(milliseconds=offsets[index])
+        })
+    return points
@@ -0,0 +1,100 @@
+import asyncio
+import secrets
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator, Optional, Set
+from app.config.settings import settings
+
+
+class Subscription:
+    """A subscriber's bounded event queue; None in the queue means it was dropped"""
+    
+    def __init__(self, max_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self.dropped = False
+    
+    async def get(self) -> Optional[dict]:
+        """Wait for the next event, or None once dropped"""
+        return await self.queue.get()
+
+
+class EventBroker:
+    """In-process publish/subscribe with per-subscriber bounded queues.
+    
+    publish() never waits: a subscriber whose queue is full is considered
+    too slow, its pending events are discarded and it receives None, so
+    one stalled client cannot hold back delivery to the others. The last
+    replay_size events are kept so reconnecting clients can catch up; event
+    ids carry a per-process prefix, so ids from before a restart (or from
+    another process) are recognised as unknown. Subscribers only see events
+    published in their own process.
+    """
+    
+    def __init__(self, queue_size: int, replay_size: int):
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscription] = set()
+        self._recent: deque = deque(maxlen=replay_size)
+        self._prefix = secrets.token_hex(4)
+        self._last_id = 0
+        self.published = 0
+        self.dropped = 0
+    
+    def publish(self, event_type: str, data: dict) -> dict:
+        """Send an event to every subscriber"""
+        self._last_id += 1
+        event = {
+            "id": f"{self._prefix}-{self._last_id}",
+            "seq": self._last_id,
+            "type": event_type,
+            "data": data
+        }
+        self._recent.append(event)
+        self.published += 1
+        
+        for subscription in list(self._subscribers):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._drop(subscription)
+        return event
+    
+    def _drop(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+        subscription.dropped = True
+        self.dropped += 1
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+    
+    def replay_after(self, last_event_id: str) -> Optional[list]:
+        """Events published after the given one, or None if that cannot be told"""
+        prefix, _, seq = last_event_id.partition("-")
+        if prefix != self._prefix or not seq.isdigit():
+            return None
+        
+        last_seq = int(seq)
+        if self._recent and self._recent[0]["seq"] > last_seq + 1:
+            return None
+        return [event for event in self._recent if event["seq"] > last_seq]
+    
+    @contextmanager
+    def subscribe(self) -> Iterator[Subscription]:
+        """Receive events published while the context is open"""
+        subscription = Subscription(self.queue_size)
+        self._subscribers.add(subscription)
+        try:
+            yield subscription
+        finally:
+            self._subscribers.discard(subscription)
+    
+    def stats(self) -> dict:
+        """Subscriber and delivery counters"""
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "dropped_subscribers": self.dropped
+        }
+
+
+# Emergency created/resolved events for dispatchers
+emergency_events = EventBroker(settings.EVENT_QUEUE_SIZE, settings.EVENT_REPLAY_SIZE)
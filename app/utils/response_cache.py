@@ -0,0 +1,89 @@
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Optional
+from fastapi import Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.config.settings import settings
+from app.utils.cache import TTLCache
+
+
+class ResponseCache:
+    """Per-user data versions and cached JSON responses for conditional GETs
+    
+    Write paths call bump(user_id) after changing a user's trips, emergencies
+    or safety checks. Cached responses are keyed by (user, path, query,
+    version), so a bump makes every older response for that user unreachable.
+    Versions are kept per process: writes handled by another worker are only
+    picked up once the cached entry expires.
+    """
+    
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self._versions: Dict[str, int] = {}
+        self._responses = TTLCache(max_size, ttl_seconds)
+        self.not_modified = 0
+    
+    def version(self, user_id: str) -> int:
+        """Current data version for a user"""
+        return self._versions.get(user_id, 0)
+    
+    def bump(self, user_id: str) -> None:
+        """Mark a user's data as changed"""
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+    
+    async def respond(
+        self,
+        request: Request,
+        user_id: str,
+        build: Callable[[], Awaitable[Any]],
+        extra_headers: Optional[Callable[[Any], Dict[str, str]]] = None
+    ) -> Response:
+        """Serve a user's GET response from cache, or 304 when the client has it
+        
+        extra_headers, if given, computes further response headers from the
+        built content; they are cached along with the body.
+        """
+        key = (user_id, request.url.path, request.url.query, self.version(user_id))
+        
+        entry = self._responses.get(key)
+        if entry is None:
+            content = await build()
+            body = JSONResponse(jsonable_encoder(content)).body
+            # Strong ETag from the body itself, so it stays valid across
+            # workers and for date-relative endpoints after the entry expires
+            etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+            entry = (etag, body, extra_headers(content) if extra_headers else {})
+            self._responses.set(key, entry)
+        
+        etag, body, extra = entry
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache", **extra}
+        
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        return Response(content=body, media_type="application/json", headers=headers)
+    
+    def stats(self) -> dict:
+        """Cache counters plus the number of tracked users and 304 responses"""
+        return {
+            **self._responses.stats(),
+            "users": len(self._versions),
+            "not_modified": self.not_modified
+        }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+response_cache = ResponseCache(
+    settings.RESPONSE_CACHE_MAX_SIZE,
+    settings.RESPONSE_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,91 @@
+import json
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+from xml.sax.saxutils import escape, quoteattr
+
+
+# Route files for GIS tools, written a bucket of points at a time (see
+# route_store.iter_route) so a download starts before the whole route is read.
+# Point speed and accuracy are kept: as GPX extensions in their own
+# namespace, and as GeoJSON feature properties.
+GPX_EXTENSIONS_NAMESPACE = "urn:initinerego:gpx:1"
+
+
+def utc_time(value: Optional[datetime]) -> Optional[str]:
+    """ISO 8601 text for a stored (naive UTC) timestamp"""
+    if value is None:
+        return None
+    return value.replace(tzinfo=None).isoformat() + "Z"
+
+
+def gpx_point(point: dict) -> str:
+    """GPX track point element"""
+    parts = [f'<trkpt lat="{point["latitude"]}" lon="{point["longitude"]}">']
+    if point.get("altitude") is not None:
+        parts.append(f'<ele>{point["altitude"]}</ele>')
+    if point.get("timestamp") is not None:
+        parts.append(f'<time>{utc_time(point["timestamp"])}</time>')
+    
+    extensions = [
+        f'<iig:{field}>{point[field]}</iig:{field}>'
+        for field in ("speed", "accuracy")
+        if point.get(field) is not None
+    ]
+    if extensions:
+        parts.append(f'<extensions>{"".join(extensions)}</extensions>')
+    
+    parts.append("</trkpt>\n")
+    return "".join(parts)
+
+
+async def gpx_chunks(trip_doc: dict, buckets: AsyncIterator[List[dict]]) -> AsyncIterator[str]:
+    """A trip route as a GPX 1.1 track"""
+    name = f"Trip {trip_doc['_id']}"
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<gpx version="1.1" creator="InItinereGo" xmlns="http://www.topografix.com/GPX/1/1" '
+        f'xmlns:iig={quoteattr(GPX_EXTENSIONS_NAMESPACE)}>\n'
+        f'<trk><name>{escape(name)}</name><type>{escape(str(trip_doc.get("vehicle_type", "")))}</type>\n'
+        '<trkseg>\n'
+    )
+    async for points in buckets:
+        yield "".join(gpx_point(point) for point in points)
+    yield "</trkseg></trk>\n</gpx>\n"
+
+
+def geojson_feature(index: int, point: dict) -> dict:
+    """GeoJSON point feature for a route point"""
+    coordinates = [point["longitude"], point["latitude"]]
+    if point.get("altitude") is not None:
+        coordinates.append(point["altitude"])
+    
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": coordinates},
+        "properties": {
+            "index": index,
+            "timestamp": utc_time(point.get("timestamp")),
+            "speed": point.get("speed"),
+            "accuracy": point.get("accuracy")
+        }
+    }
+
+
+async def geojson_chunks(trip_doc: dict, buckets: AsyncIterator[List[dict]]) -> AsyncIterator[str]:
+    """A trip route as a GeoJSON FeatureCollection of points, in route order"""
+    properties = {
+        "trip_id": str(trip_doc["_id"]),
+        "vehicle_type": trip_doc.get("vehicle_type"),
+        "started_at": utc_time(trip_doc.get("started_at")),
+        "completed_at": utc_time(trip_doc.get("completed_at"))
+    }
+    yield '{"type": "FeatureCollection", "properties": %s, "features": [\n' % json.dumps(properties)
+    
+    index = 0
+    async for points in buckets:
+        features = []
+        for point in points:
+            features.append(("" if index == 0 else ",\n") + json.dumps(geojson_feature(index, point)))
+            index += 1
+        yield "".join(features)
+    yield "\n]}\n"
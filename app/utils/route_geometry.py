@@ -0,0 +1,222 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371
+EPOCH = datetime(1970, 1, 1)  # Route timestamps are stored as naive UTC
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Calculate distances in km between coordinates, element-wise over arrays"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Calculate distance in km between two GPS coordinates"""
+    return float(haversine_km(lat1, lon1, lat2, lon2))
+
+
+def coordinate_arrays(points: List[dict]):
+    """Split route points into latitude and longitude arrays"""
+    count = len(points)
+    lats = np.fromiter((point["latitude"] for point in points), dtype=float, count=count)
+    lons = np.fromiter((point["longitude"] for point in points), dtype=float, count=count)
+    return lats, lons
+
+
+def route_arrays(points: List[dict]):
+    """Split route points into latitude, longitude and epoch-seconds arrays"""
+    lats, lons = coordinate_arrays(points)
+    seconds = np.fromiter(
+        ((point["timestamp"] - EPOCH).total_seconds() for point in points),
+        dtype=float,
+        count=len(points)
+    )
+    return lats, lons, seconds
+
+
+def segment_distances_km(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Distances in km between consecutive coordinates"""
+    if len(lats) < 2:
+        return np.zeros(0)
+    return haversine_km(lats[:-1], lons[:-1], lats[1:], lons[1:])
+
+
+def path_distance_km(points: List[dict], start: Optional[dict] = None) -> float:
+    """Distance in km along a sequence of points, optionally from a start point"""
+    if start is not None:
+        points = [start, *points]
+    if len(points) < 2:
+        return 0.0
+    
+    lats, lons = coordinate_arrays(points)
+    return float(segment_distances_km(lats, lons).sum())
+
+
+def compute_route_metrics(points: List[dict]) -> dict:
+    """Compute distance, per-segment speed, bounding box and duration of a route in one pass"""
+    if not points:
+        return {
+            "distance_km": 0.0,
+            "cumulative_km": np.zeros(0),
+            "segment_speed_kmh": np.zeros(0),
+            "max_speed_kmh": 0.0,
+            "bbox": None,
+            "duration_minutes": 0
+        }
+    
+    lats, lons, seconds = route_arrays(points)
+    segments = segment_distances_km(lats, lons)
+    cumulative = np.concatenate(([0.0], np.cumsum(segments)))
+    
+    # Segments without elapsed time (duplicate fixes) get no speed
+    elapsed_hours = np.diff(seconds) / 3600
+    speeds = np.divide(
+        segments, elapsed_hours,
+        out=np.zeros_like(segments), where=elapsed_hours > 0
+    )
+    
+    return {
+        "distance_km": float(cumulative[-1]),
+        "cumulative_km": cumulative,
+        "segment_speed_kmh": speeds,
+        "max_speed_kmh": float(speeds.max()) if len(speeds) else 0.0,
+        # GeoJSON order: [min_lon, min_lat, max_lon, max_lat]
+        "bbox": [float(lons.min()), float(lats.min()), float(lons.max()), float(lats.max())],
+        "duration_minutes": int((seconds[-1] - seconds[0]) / 60)
+    }
+
+
+def compute_path_distances_km(paths: List[List[dict]]) -> np.ndarray:
+    """Total distance in km of many paths, computed over one concatenated array"""
+    lengths = np.fromiter((len(path) for path in paths), dtype=int, count=len(paths))
+    totals = np.zeros(len(paths))
+    if lengths.sum() < 2:
+        return totals
+    
+    points = [point for path in paths for point in path]
+    lats, lons = coordinate_arrays(points)
+    segments = segment_distances_km(lats, lons)
+    
+    # Segment i joins point i and i+1; drop the ones crossing into the next path
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    crossing = ends[:-1] - 1
+    segments[crossing[(crossing >= 0) & (crossing < len(segments))]] = 0.0
+    
+    # Sum each path's segments: they span [start, end - 1)
+    cumulative = np.concatenate(([0.0], np.cumsum(segments)))
+    nonempty = lengths > 0
+    totals[nonempty] = cumulative[ends[nonempty] - 1] - cumulative[starts[nonempty]]
+    return totals
+
+
+def trip_path(trip_doc: dict, route: List[dict]) -> List[dict]:
+    """Full path of a trip: origin, recorded route and destination when known"""
+    path = []
+    if trip_doc.get("origin"):
+        path.append(trip_doc["origin"])
+    path.extend(route)
+    if trip_doc.get("destination"):
+        path.append(trip_doc["destination"])
+    return path
+
+
+def douglas_peucker_ranks(points: List[dict]) -> np.ndarray:
+    """Rank route points by the Douglas-Peucker tolerance (metres) that would drop them.
+
+    Simplifying with a tolerance t keeps exactly the points ranked above t, and
+    keeping the N highest-ranked points gives the best N-point simplification,
+    so one ranking answers both kinds of request. Endpoints rank as infinite.
+    """
+    count = len(points)
+    ranks = np.zeros(count)
+    if count == 0:
+        return ranks
+    ranks[0] = ranks[-1] = np.inf
+    
+    # Local equirectangular projection in metres, accurate at route scale
+    lats, lons = coordinate_arrays(points)
+    metres_per_radian = EARTH_RADIUS_KM * 1000
+    x = np.radians(lons) * metres_per_radian * np.cos(np.radians(lats.mean()))
+    y = np.radians(lats) * metres_per_radian
+    
+    stack = [(0, count - 1, np.inf)]
+    while stack:
+        first, last, limit = stack.pop()
+        if last - first < 2:
+            continue
+        
+        # Distance of the inner points to the segment first-last
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px, py = x[first + 1:last] - x[first], y[first + 1:last] - y[first]
+        length_sq = dx * dx + dy * dy
+        if length_sq > 0:
+            t = np.clip((px * dx + py * dy) / length_sq, 0, 1)
+            distances = np.hypot(px - t * dx, py - t * dy)
+        else:
+            distances = np.hypot(px, py)
+        
+        farthest = int(np.argmax(distances))
+        index = first + 1 + farthest
+        # A point never outranks the split that exposed it
+        rank = min(float(distances[farthest]), limit)
+        ranks[index] = rank
+        
+        stack.append((first, index, rank))
+        stack.append((index, last, rank))
+    
+    return ranks
+
+
+def simplify_route(
+    points: List[dict],
+    tolerance_m: Optional[float] = None,
+    max_points: Optional[int] = None
+) -> List[dict]:
+    """Simplify a route with Douglas-Peucker, by tolerance and/or target point count"""
+    if len(points) < 3 or (tolerance_m is None and max_points is None):
+        return list(points)
+    
+    ranks = douglas_peucker_ranks(points)
+    keep = np.ones(len(points), dtype=bool)
+    if tolerance_m is not None:
+        keep &= ranks > tolerance_m
+    if max_points is not None and keep.sum() > max_points:
+        top = np.zeros(len(points), dtype=bool)
+        top[np.argsort(-ranks, kind="stable")[:max(max_points, 2)]] = True
+        keep &= top
+    
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def simplify_preview(
+    points: List[dict],
+    tolerance_m: float,
+    max_points: int
+) -> Tuple[List[dict], float]:
+    """Simplify a route to at most max_points, with the tolerance that was effectively applied
+
+    Noisy routes keep most of their points at a small tolerance; the point
+    cap then drops more, which raises the effective tolerance to the rank
+    of the highest-ranked point dropped.
+    """
+    if len(points) < 3:
+        return list(points), tolerance_m
+    
+    ranks = douglas_peucker_ranks(points)
+    order = np.argsort(-ranks, kind="stable")
+    keep = np.zeros(len(points), dtype=bool)
+    keep[order[:max(max_points, 2)]] = True
+    keep &= ranks > tolerance_m
+    keep[0] = keep[-1] = True
+    
+    dropped = ranks[~keep]
+    effective = max(tolerance_m, float(dropped.max())) if len(dropped) else tolerance_m
+    return [point for point, kept in zip(points, keep) if kept], effective
@@ -0,0 +1,263 @@
+import heapq
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from pymongo import UpdateOne
+from app.config.database import db
+from app.config.settings import settings
+from app.utils.polyline import encode_route, decode_route
+
+
+# Route points live outside the trip document, in fixed-size buckets:
+#   {"trip_id", "bucket", "count", "start_at", "end_at", "points": [...]}
+# Point number i of a trip is stored in bucket i // ROUTE_BUCKET_SIZE.
+# Trips created before buckets existed may still embed a "route" array;
+# those points come first when reading.
+#
+# Points get their route index, and so their bucket, in arrival order, and
+# each bucket is kept sorted by time ($push with $sort). Late points (an
+# offline queue flushed after newer live pings) land in a later bucket than
+# newer ones, so bucket time ranges can overlap: loaded and streamed routes
+# are merged back into time order; index-based pages follow bucket order.
+#
+# With ROUTE_STORAGE_FORMAT = "encoded", the buckets of a completed trip are
+# compacted: "points" is replaced by an "encoded" route (see app.utils.polyline).
+POINTS_COLLECTION = "trip_points"
+
+# Buckets read per query when streaming a route
+STREAM_BUCKETS_PER_QUERY = 20
+
+
+def bucket_points(bucket: dict) -> List[dict]:
+    """Get the points of a bucket, whether stored raw or encoded"""
+    if "encoded" in bucket:
+        return decode_route(bucket["encoded"])
+    return bucket.get("points", [])
+
+
+def bucket_chunks(first_index: int, points: List[dict]) -> List[Tuple[int, List[dict]]]:
+    """Split points stored from a given route index into (bucket, points) chunks"""
+    bucket_size = settings.ROUTE_BUCKET_SIZE
+    chunks = []
+    offset = 0
+    
+    while offset < len(points):
+        index = first_index + offset
+        take = min(bucket_size - index % bucket_size, len(points) - offset)
+        chunks.append((index // bucket_size, points[offset:offset + take]))
+        offset += take
+    
+    return chunks
+
+
+def bucket_update(trip_id: str, bucket: int, points: List[dict]) -> UpdateOne:
+    """Build the write adding points to one bucket"""
+    timestamps = [point["timestamp"] for point in points]
+    
+    return UpdateOne(
+        {"trip_id": trip_id, "bucket": bucket},
+        {
+            "$push": {"points": {"$each": points, "$sort": {"timestamp": 1}}},
+            "$inc": {"count": len(points)},
+            "$min": {"start_at": min(timestamps)},
+            "$max": {"end_at": max(timestamps)}
+        },
+        upsert=True
+    )
+
+
+def bucket_updates(trip_id: str, first_index: int, points: List[dict]) -> List[UpdateOne]:
+    """Build the bucket writes storing points from a given route index onwards"""
+    return [
+        bucket_update(trip_id, bucket, chunk)
+        for bucket, chunk in bucket_chunks(first_index, points)
+    ]
+
+
+def bucket_documents(trip_id: str, points: List[dict], encoded: bool = False) -> List[dict]:
+    """Build the buckets of a complete route, for trips written in one go"""
+    documents = []
+    for bucket, chunk in bucket_chunks(0, points):
+        document = {
+            "trip_id": trip_id,
+            "bucket": bucket,
+            "count": len(chunk),
+            "start_at": min(point["timestamp"] for point in chunk),
+            "end_at": max(point["timestamp"] for point in chunk)
+        }
+        if encoded:
+            document["encoded"] = encode_route(chunk)
+        else:
+            document["points"] = chunk
+        documents.append(document)
+    return documents
+
+
+async def append_points(trip_id: str, first_index: int, points: List[dict]) -> None:
+    """Store route points starting at a given route index"""
+    if not points:
+        return
+    
+    points_collection = db.get_collection(POINTS_COLLECTION)
+    await points_collection.bulk_write(
+        bucket_updates(trip_id, first_index, points),
+        ordered=False
+    )
+
+
+async def load_routes(trip_docs: List[dict]) -> Dict[str, List[dict]]:
+    """Load the full routes of several trips with a single bucket query"""
+    routes = {str(trip["_id"]): list(trip.get("route") or []) for trip in trip_docs}
+    stored = [str(trip["_id"]) for trip in trip_docs if trip.get("point_count")]
+    
+    if stored:
+        points_collection = db.get_collection(POINTS_COLLECTION)
+        cursor = points_collection.find(
+            {"trip_id": {"$in": stored}},
+            projection={"_id": 0, "trip_id": 1, "points": 1, "encoded": 1},
+            sort=[("trip_id", 1), ("bucket", 1)]
+        )
+        async for bucket in cursor:
+            routes[bucket["trip_id"]].extend(bucket_points(bucket))
+    
+    # Sorting is stable and close to linear for routes already in order
+    for route in routes.values():
+        route.sort(key=lambda point: point["timestamp"])
+    return routes
+
+
+async def iter_route(trip_doc: dict) -> AsyncIterator[List[dict]]:
+    """Yield the full route of a trip in time order, a chunk at a time
+    
+    Buckets are read by start time and merged: points are held only until
+    no unread bucket can start before them, so memory stays bounded by the
+    buckets whose time ranges overlap.
+    """
+    trip_id = str(trip_doc["_id"])
+    points_collection = db.get_collection(POINTS_COLLECTION)
+    
+    # Bucket numbers by start time, then their points a few buckets at a time
+    order = []
+    if trip_doc.get("point_count"):
+        cursor = points_collection.find(
+            {"trip_id": trip_id},
+            projection={"_id": 0, "bucket": 1, "start_at": 1}
+        )
+        order = [(bucket["start_at"], bucket["bucket"]) async for bucket in cursor]
+        order.sort()
+    
+    heap = []
+    sequence = 0
+    
+    def hold(points: List[dict]) -> None:
+        nonlocal sequence
+        for point in points:
+            heapq.heappush(heap, (point["timestamp"], sequence, point))
+            sequence += 1
+    
+    def release(before: Optional[datetime] = None) -> List[dict]:
+        chunk = []
+        while heap and (before is None or heap[0][0] < before):
+            chunk.append(heapq.heappop(heap)[2])
+        return chunk
+    
+    hold(trip_doc.get("route") or [])
+    for offset in range(0, len(order), STREAM_BUCKETS_PER_QUERY):
+        batch = order[offset:offset + STREAM_BUCKETS_PER_QUERY]
+        cursor = points_collection.find(
+            {"trip_id": trip_id, "bucket": {"$in": [number for _, number in batch]}},
+            projection={"_id": 0, "bucket": 1, "points": 1, "encoded": 1}
+        )
+        buckets = {bucket["bucket"]: bucket async for bucket in cursor}
+        
+        for start_at, number in batch:
+            chunk = release(before=start_at)
+            if chunk:
+                yield chunk
+            if number in buckets:
+                hold(bucket_points(buckets[number]))
+    
+    chunk = release()
+    if chunk:
+        yield chunk
+
+
+async def load_route(trip_doc: dict) -> List[dict]:
+    """Load the full route of a trip"""
+    routes = await load_routes([trip_doc])
+    return routes[str(trip_doc["_id"])]
+
+
+async def get_route_page(
+    trip_doc: dict,
+    offset: int,
+    limit: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> Tuple[List[dict], int]:
+    """Get a window of route points and the total number of points in range"""
+    trip_id = str(trip_doc["_id"])
+    legacy = list(trip_doc.get("route") or [])
+    point_count = trip_doc.get("point_count") or 0
+    points_collection = db.get_collection(POINTS_COLLECTION)
+    
+    if start is not None or end is not None:
+        # Time window: only buckets overlapping the window are read
+        query = {"trip_id": trip_id}
+        if start is not None:
+            query["end_at"] = {"$gte": start}
+        if end is not None:
+            query["start_at"] = {"$lte": end}
+        
+        points = legacy
+        if point_count:
+            cursor = points_collection.find(query, sort=[("bucket", 1)])
+            async for bucket in cursor:
+                points.extend(bucket_points(bucket))
+        
+        points = [
+            point for point in points
+            if (start is None or point["timestamp"] >= start)
+            and (end is None or point["timestamp"] <= end)
+        ]
+        points.sort(key=lambda point: point["timestamp"])
+        return points[offset:offset + limit], len(points)
+    
+    # Index window: legacy points first, then only the buckets covering it
+    total = len(legacy) + point_count
+    page = legacy[offset:offset + limit]
+    
+    first = max(offset - len(legacy), 0)
+    last = min(offset + limit - len(legacy), point_count)
+    if first < last:
+        bucket_size = settings.ROUTE_BUCKET_SIZE
+        cursor = points_collection.find(
+            {
+                "trip_id": trip_id,
+                "bucket": {"$gte": first // bucket_size, "$lte": (last - 1) // bucket_size}
+            },
+            sort=[("bucket", 1)]
+        )
+        async for bucket in cursor:
+            base = bucket["bucket"] * bucket_size
+            page.extend(bucket_points(bucket)[max(first - base, 0):last - base])
+    
+    return page, total
+
+
+async def compact_route(trip_id: str) -> None:
+    """Replace the raw points of a finished trip's buckets with encoded routes"""
+    points_collection = db.get_collection(POINTS_COLLECTION)
+    
+    updates = []
+    cursor = points_collection.find({"trip_id": trip_id, "points": {"$exists": True}})
+    async for bucket in cursor:
+        updates.append(UpdateOne(
+            {"_id": bucket["_id"]},
+            {
+                "$set": {"encoded": encode_route(bucket["points"])},
+                "$unset": {"points": ""}
+            }
+        ))
+    
+    if updates:
+        await points_collection.bulk_write(updates, ordered=False)
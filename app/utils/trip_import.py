@@ -0,0 +1,410 @@
+import asyncio
+import csv
+import hashlib
+import io
+import logging
+import multiprocessing
+import xml.etree.ElementTree as ElementTree
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from app.config.database import db
+from app.config.settings import settings
+from app.schemas.pydantic_models import RouteFormat, TripStatus
+from app.utils import route_store
+from app.utils.daily_rollups import increment_rollup
+from app.utils.geo import geo_point, valid_coordinate
+from app.utils.route_geometry import compute_route_metrics, simplify_preview
+from app.utils.user_stats import increment_user_stats
+
+
+logger = logging.getLogger(__name__)
+
+# Imported trips are completed trips built from recorded traces: a GPX track
+# or the CSV rows sharing a "trip" value. Files are parsed and validated in
+# worker processes (parse_import_file takes and returns plain data), then
+# written in batches of IMPORT_BATCH_TRIPS with bulk inserts: route buckets
+# first, then trips, then the user's stats and rollups.
+#
+# Each trip gets an import_key from its user and points, unique in the trips
+# collection, so importing the same files again skips the trips already in.
+CSV_COLUMNS = ("latitude", "longitude", "timestamp")
+CSV_OPTIONAL_COLUMNS = ("altitude", "speed", "accuracy")
+GPX_TRACKPOINT_EXTENSIONS = ("speed", "accuracy")
+
+
+def parse_time(text: str) -> datetime:
+    """Naive UTC datetime from ISO 8601 text"""
+    value = datetime.fromisoformat(text.strip().replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def optional_float(text: Optional[str]) -> Optional[float]:
+    """Float from text that may be missing or blank"""
+    if text is None or not text.strip():
+        return None
+    return float(text)
+
+
+def local_name(tag: str) -> str:
+    """XML tag without its namespace"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_gpx(content: bytes) -> List[Tuple[str, List[dict]]]:
+    """(name, points) of every track in a GPX file, all its segments joined"""
+    root = ElementTree.fromstring(content)
+    tracks = []
+    
+    for number, track in enumerate(element for element in root if local_name(element.tag) == "trk"):
+        name = f"track {number + 1}"
+        points = []
+        for element in track.iter():
+            tag = local_name(element.tag)
+            if tag == "name" and element.text:
+                name = element.text.strip()
+            elif tag == "trkpt":
+                point = {
+                    "latitude": float(element.get("lat")),
+                    "longitude": float(element.get("lon")),
+                    "altitude": None,
+                    "accuracy": None,
+                    "speed": None,
+                    "timestamp": None
+                }
+                for child in element.iter():
+                    child_tag = local_name(child.tag)
+                    if child_tag == "ele":
+                        point["altitude"] = optional_float(child.text)
+                    elif child_tag == "time" and child.text:
+                        point["timestamp"] = parse_time(child.text)
+                    elif child_tag in GPX_TRACKPOINT_EXTENSIONS:
+                        point[child_tag] = optional_float(child.text)
+                points.append(point)
+        tracks.append((name, points))
+    
+    return tracks
+
+
+def parse_csv(content: bytes) -> List[Tuple[str, List[dict]]]:
+    """(trip, points) of a CSV file, grouping rows by their "trip" column if any"""
+    reader = csv.DictReader(io.StringIO(content.decode("utf-8-sig")))
+    missing = [column for column in CSV_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"Missing CSV columns: {', '.join(missing)}")
+    
+    trips: Dict[str, List[dict]] = {}
+    for row in reader:
+        point = {
+            "latitude": float(row["latitude"]),
+            "longitude": float(row["longitude"]),
+            "timestamp": parse_time(row["timestamp"]) if row["timestamp"] else None
+        }
+        for column in CSV_OPTIONAL_COLUMNS:
+            point[column] = optional_float(row.get(column))
+        trips.setdefault(row.get("trip") or "trip 1", []).append(point)
+    
+    return list(trips.items())
+
+
+def build_imported_trip(points: List[dict]) -> dict:
+    """Trip document fields for a validated trace, raising ValueError if invalid"""
+    for number, point in enumerate(points, start=1):
+        if not valid_coordinate(point["latitude"], point["longitude"]):
+            raise ValueError(f"point {number} has invalid coordinates")
+        if point["timestamp"] is None:
+            raise ValueError(f"point {number} has no timestamp")
+    if len(points) < 2:
+        raise ValueError("a trip needs at least two points")
+    
+    points = sorted(points, key=lambda point: point["timestamp"])
+    metrics = compute_route_metrics(points)
+    origin, destination = points[0], points[-1]
+    preview, preview_tolerance = simplify_preview(
+        points, settings.ROUTE_SIMPLIFY_TOLERANCE_M, settings.ROUTE_PREVIEW_MAX_POINTS
+    )
+    
+    return {
+        "status": TripStatus.COMPLETED.value,
+        "origin": origin,
+        "destination": destination,
+        "distance_km": metrics["distance_km"],
+        "duration_minutes": metrics["duration_minutes"],
+        "max_speed_kmh": metrics["max_speed_kmh"],
+        "bbox": metrics["bbox"],
+        "point_count": len(points),
+        "last_location": destination,
+        "last_position": geo_point(destination["latitude"], destination["longitude"]),
+        "simplified_route": preview,
+        "simplified_tolerance_m": preview_tolerance,
+        "started_at": origin["timestamp"],
+        "completed_at": destination["timestamp"],
+        # Historical trips are listed by when they happened
+        "created_at": origin["timestamp"],
+        "route": points
+    }
+
+
+def parse_import_file(filename: str, source: Union[bytes, Path]) -> dict:
+    """Parse and validate a GPX or CSV file into trips (runs in a worker process)"""
+    report = {"filename": filename, "trips": [], "errors": []}
+    
+    try:
+        content = source.read_bytes() if isinstance(source, Path) else source
+        if filename.lower().endswith(".gpx"):
+            traces = parse_gpx(content)
+        elif filename.lower().endswith(".csv"):
+            traces = parse_csv(content)
+        else:
+            raise ValueError("Unsupported file type (expected .gpx or .csv)")
+    except Exception as e:
+        report["errors"].append(f"{filename}: {e}")
+        return report
+    
+    for name, points in traces:
+        try:
+            trip = build_imported_trip(points)
+        except ValueError as e:
+            report["errors"].append(f"{filename}, {name}: {e}")
+            continue
+        trip["import_source"] = {"filename": filename, "trace": name}
+        report["trips"].append(trip)
+    
+    return report
+
+
+def import_key(user_id: str, trip: dict) -> str:
+    """Identity of an imported trip, so it is not imported twice"""
+    route = trip["route"]
+    raw = f"{user_id}|{route[0]['timestamp'].isoformat()}|{route[-1]['timestamp'].isoformat()}|{len(route)}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+class TripImportWriter:
+    """Bulk-writes imported trips in batches and keeps the import's totals"""
+    
+    def __init__(self, user_id: str, vehicle_type: str, dry_run: bool = False):
+        self.user_id = user_id
+        self.vehicle_type = vehicle_type
+        self.dry_run = dry_run
+        self._batch: List[dict] = []
+        self.imported = 0
+        self.duplicates = 0
+        self.points = 0
+    
+    async def add(self, trips: List[dict]) -> None:
+        """Queue trips, writing every full batch"""
+        for trip in trips:
+            self._batch.append(trip)
+            if len(self._batch) >= settings.IMPORT_BATCH_TRIPS:
+                await self.flush()
+    
+    async def flush(self) -> None:
+        """Write the queued trips and their route buckets, and apply them to stats and rollups"""
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        
+        routes = {}
+        for trip in batch:
+            trip["_id"] = ObjectId()
+            trip["user_id"] = self.user_id
+            trip["vehicle_type"] = self.vehicle_type
+            trip["import_key"] = import_key(self.user_id, trip)
+            trip["imported_at"] = datetime.utcnow()
+            routes[trip["_id"]] = trip.pop("route")
+        
+        # Skip trips imported before, or twice in this import. Checked here
+        # rather than left to the unique import_key index, which may still be
+        # building in the background.
+        trips_collection = db.get_collection("trips")
+        seen = set()
+        async for trip in trips_collection.find(
+            {"import_key": {"$in": [trip["import_key"] for trip in batch]}},
+            projection={"import_key": 1}
+        ):
+            seen.add(trip["import_key"])
+        
+        written = []
+        for trip in batch:
+            if trip["import_key"] in seen:
+                self.duplicates += 1
+            else:
+                seen.add(trip["import_key"])
+                written.append(trip)
+        
+        if self.dry_run:
+            self._count(written)
+            return
+        
+        if written:
+            written = await self._insert(written, routes)
+        self._count(written)
+        await self._apply(written)
+    
+    async def _insert(self, trips: List[dict], routes: Dict[ObjectId, List[dict]]) -> List[dict]:
+        """Insert route buckets, then their trips: a trip is never stored without its route"""
+        points_collection = db.get_collection(route_store.POINTS_COLLECTION)
+        encoded = settings.ROUTE_STORAGE_FORMAT == RouteFormat.ENCODED.value
+        buckets = []
+        for trip in trips:
+            buckets.extend(route_store.bucket_documents(str(trip["_id"]), routes[trip["_id"]], encoded))
+        
+        trip_ids = [str(trip["_id"]) for trip in trips]
+        try:
+            await points_collection.insert_many(buckets, ordered=False)
+        except Exception:
+            await points_collection.delete_many({"trip_id": {"$in": trip_ids}})
+            raise
+        
+        trips_collection = db.get_collection("trips")
+        try:
+            await trips_collection.insert_many(trips, ordered=False)
+            return trips
+        except BulkWriteError as e:
+            # Other trips were written: keep them, drop the routes of the others
+            errors = e.details["writeErrors"]
+            failed = {error["index"] for error in errors}
+            await points_collection.delete_many({"trip_id": {"$in": [trip_ids[index] for index in failed]}})
+            written = [trip for index, trip in enumerate(trips) if index not in failed]
+            
+            # A concurrent import of the same trips wins on the unique import_key
+            duplicates = sum(1 for error in errors if error["code"] == 11000)
+            self.duplicates += duplicates
+            if duplicates < len(errors):
+                self._count(written)
+                await self._apply(written)
+                raise
+            return written
+        except Exception:
+            await trips_collection.delete_many({"_id": {"$in": [trip["_id"] for trip in trips]}})
+            await points_collection.delete_many({"trip_id": {"$in": trip_ids}})
+            raise
+    
+    def _count(self, trips: List[dict]) -> None:
+        """Add written trips to the import's totals and pending stats"""
+        for trip in trips:
+            self.imported += 1
+            self.points += trip["point_count"]
+    
+    async def _apply(self, trips: List[dict]) -> None:
+        """Apply written trips to the user's stats and daily rollups"""
+        if not trips:
+            return
+        
+        await increment_user_stats(
+            self.user_id,
+            total_trips=len(trips),
+            completed_trips=len(trips),
+            total_distance_km=sum(trip["distance_km"] for trip in trips),
+            total_duration_minutes=sum(trip["duration_minutes"] for trip in trips)
+        )
+        # One rollup write per hour with imported trips, not per trip
+        rollups: Dict[datetime, dict] = defaultdict(
+            lambda: {"trips": 0, "completed": 0, "distance_km": 0.0, "duration_minutes": 0}
+        )
+        for trip in trips:
+            rollup = rollups[trip["started_at"].replace(minute=0, second=0, microsecond=0)]
+            rollup["trips"] += 1
+            rollup["completed"] += 1
+            rollup["distance_km"] += trip["distance_km"]
+            rollup["duration_minutes"] += trip["duration_minutes"]
+        for hour, deltas in rollups.items():
+            await increment_rollup(self.user_id, hour, **deltas)
+    
+    async def finish(self) -> None:
+        """Write the last batch"""
+        await self.flush()
+
+
+# Worker processes shared by every import, started on first use
+_parse_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """Process pool parsing import files"""
+    global _parse_pool
+    if _parse_pool is None:
+        # Spawned, not forked: a fork would copy the event loop and the
+        # MongoDB client's threads into every worker
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=settings.IMPORT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _parse_pool
+
+
+def shutdown_parse_pool() -> None:
+    """Stop the parsing workers"""
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+
+
+async def import_trip_files(
+    files: List[Tuple[str, Union[bytes, Path, Callable[[], Awaitable[bytes]]]]],
+    user_id: str,
+    vehicle_type: str,
+    dry_run: bool = False
+) -> dict:
+    """Import GPX/CSV files, given as (filename, content, path or reader), as one user's completed trips
+    
+    A reader is a coroutine function returning the content, awaited only
+    once a worker is free for the file.
+    """
+    writer = TripImportWriter(user_id, vehicle_type, dry_run)
+    file_reports = []
+    
+    async def write_parsed(report: dict) -> None:
+        await writer.add(report["trips"])
+        file_reports.append({
+            "filename": report["filename"],
+            "trips": len(report["trips"]),
+            "errors": report["errors"]
+        })
+    
+    loop = asyncio.get_running_loop()
+    pool = get_parse_pool()
+    
+    # Keep a couple of files per worker in flight, writing each file's
+    # trips as soon as it is parsed, so memory does not grow with the import
+    pending = set()
+    for filename, source in files:
+        if len(pending) >= settings.IMPORT_WORKERS * 2:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for parsed in done:
+                await write_parsed(parsed.result())
+        
+        if callable(source):
+            source = await source()
+        size = source.stat().st_size if isinstance(source, Path) else len(source)
+        if size > settings.IMPORT_MAX_FILE_BYTES:
+            file_reports.append({
+                "filename": filename,
+                "trips": 0,
+                "errors": [f"{filename}: larger than {settings.IMPORT_MAX_FILE_BYTES} bytes"]
+            })
+            continue
+        
+        pending.add(loop.run_in_executor(pool, parse_import_file, filename, source))
+    
+    for parsed in asyncio.as_completed(pending):
+        await write_parsed(await parsed)
+    
+    await writer.finish()
+    logger.info("Imported %d trips (%d already present) for user %s",
+                writer.imported, writer.duplicates, user_id)
+    
+    return {
+        "trips_imported": writer.imported,
+        "duplicates_skipped": writer.duplicates,
+        "points_imported": writer.points,
+        "files": sorted(file_reports, key=lambda report: report["filename"])
+    }
@@ -0,0 +1,123 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+from app.config.database import db
+from app.schemas.pydantic_models import TripStatus
+
+
+# One document per user ({"_id": user_id, <DashboardStats fields>}) kept up to
+# date by the write paths. Increments never create the document: a user without
+# one gets it rebuilt from the raw collections on first read, so the totals
+# always start from a full recount. Distance and duration only include trips
+# that have finished (completed or ended in emergency).
+STATS_COLLECTION = "user_stats"
+
+STAT_FIELDS = (
+    "total_trips",
+    "completed_trips",
+    "active_trips",
+    "total_emergencies",
+    "safety_checks_passed",
+    "total_distance_km",
+    "total_duration_minutes"
+)
+
+
+async def increment_user_stats(user_id: str, **deltas) -> None:
+    """Apply counter changes to a user's stats document, if it exists"""
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+    
+    stats_collection = db.get_collection(STATS_COLLECTION)
+    await stats_collection.update_one(
+        {"_id": user_id},
+        {"$inc": deltas, "$set": {"updated_at": datetime.utcnow()}}
+    )
+
+
+def finished_trip_deltas(trip_doc: dict) -> dict:
+    """Stat changes when a trip leaves its current status for emergency"""
+    if trip_doc.get("status") == TripStatus.IN_PROGRESS.value:
+        return {
+            "active_trips": -1,
+            "total_distance_km": trip_doc.get("distance_km", 0),
+            "total_duration_minutes": trip_doc.get("duration_minutes", 0)
+        }
+    if trip_doc.get("status") == TripStatus.COMPLETED.value:
+        return {"completed_trips": -1}
+    return {}
+
+
+async def compute_user_stats(user_id: str) -> dict:
+    """Recompute a user's stats from the raw collections"""
+    trips_collection = db.get_collection("trips")
+    emergencies_collection = db.get_collection("emergencies")
+    safety_checks_collection = db.get_collection("safety_checks")
+    
+    trip_totals = trips_collection.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {
+            "_id": None,
+            "total_trips": {"$sum": 1},
+            "completed_trips": {
+                "$sum": {"$cond": [{"$eq": ["$status", TripStatus.COMPLETED.value]}, 1, 0]}
+            },
+            "active_trips": {
+                "$sum": {"$cond": [{"$eq": ["$status", TripStatus.IN_PROGRESS.value]}, 1, 0]}
+            },
+            "total_distance_km": {
+                "$sum": {"$cond": [
+                    {"$eq": ["$status", TripStatus.IN_PROGRESS.value]}, 0, "$distance_km"
+                ]}
+            },
+            "total_duration_minutes": {
+                "$sum": {"$cond": [
+                    {"$eq": ["$status", TripStatus.IN_PROGRESS.value]}, 0, "$duration_minutes"
+                ]}
+            }
+        }}
+    ]).to_list(length=1)
+    
+    trip_data, emergencies_count, safety_checks_passed = await asyncio.gather(
+        trip_totals,
+        emergencies_collection.count_documents({"user_id": user_id}),
+        safety_checks_collection.count_documents({
+            "user_id": user_id,
+            "status": "passed"
+        })
+    )
+    
+    totals = trip_data[0] if trip_data else {}
+    return {
+        "total_trips": totals.get("total_trips", 0),
+        "completed_trips": totals.get("completed_trips", 0),
+        "active_trips": totals.get("active_trips", 0),
+        "total_emergencies": emergencies_count,
+        "safety_checks_passed": safety_checks_passed,
+        "total_distance_km": totals.get("total_distance_km", 0.0),
+        "total_duration_minutes": totals.get("total_duration_minutes", 0)
+    }
+
+
+async def rebuild_user_stats(user_id: str) -> dict:
+    """Recompute a user's stats from scratch and store them"""
+    stats = await compute_user_stats(user_id)
+    
+    stats_collection = db.get_collection(STATS_COLLECTION)
+    await stats_collection.replace_one(
+        {"_id": user_id},
+        {**stats, "updated_at": datetime.utcnow()},
+        upsert=True
+    )
+    return stats
+
+
+async def get_user_stats(user_id: str) -> dict:
+    """Get a user's stats, building them on first use"""
+    stats_collection = db.get_collection(STATS_COLLECTION)
+    stats: Optional[dict] = await stats_collection.find_one({"_id": user_id})
+    
+    if stats is None:
+        return await rebuild_user_stats(user_id)
+    return stats
@@ -51,10 +51,13 @@ export const AuthProvider = ({ children }) => {
         password
       });
 
-      const { access_token, user: userData } = response.data;
+      const { access_token, user: userData, refresh_token } = response.data;
 
       // Store in AsyncStorage
       await AsyncStorage.setItem(storageKeys.TOKEN, access_token);
+      if (refresh_token) {
+        await AsyncStorage.setItem(storageKeys.REFRESH_TOKEN, refresh_token);
+      }
       await AsyncStorage.setItem(storageKeys.USER, JSON.stringify(userData));
 
       // Update state
@@ -83,10 +86,13 @@ export const AuthProvider = ({ children }) => {
       setLoading(true);
 
       const response = await api.post('/auth/register', userData);
-      const { access_token, user: newUser } = response.data;
+      const { access_token, user: newUser, refresh_token } = response.data;
 
       // Store in AsyncStorage
       await AsyncStorage.setItem(storageKeys.TOKEN, access_token);
+      if (refresh_token) {
+        await AsyncStorage.setItem(storageKeys.REFRESH_TOKEN, refresh_token);
+      }
       await AsyncStorage.setItem(storageKeys.USER, JSON.stringify(newUser));
 
       // Update state
@@ -112,6 +118,7 @@ export const AuthProvider = ({ children }) => {
   const logout = useCallback(async () => {
     try {
       await AsyncStorage.removeItem(storageKeys.TOKEN);
+      await AsyncStorage.removeItem(storageKeys.REFRESH_TOKEN);
       await AsyncStorage.removeItem(storageKeys.USER);
       delete api.defaults.headers.common['Authorization'];
       setToken(null);
@@ -28,7 +28,7 @@ const HomeScreen = () => {
     try {
       const [dashboardRes, tripsRes] = await Promise.all([
         dashboardAPI.getStats(),
-        tripsAPI.getAll({ limit: 5 }),
+        tripsAPI.getAll({ limit: 5, view: 'summary' }),
       ]);
 
       setStats(dashboardRes.data);
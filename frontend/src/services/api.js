@@ -1,6 +1,6 @@
 import axios from 'axios';
 import AsyncStorage from '@react-native-async-storage/async-storage';
-import { API_BASE_URL } from '../utils/constants';
+import { API_BASE_URL, storageKeys } from '../utils/constants';
 
 const api = axios.create({
   baseURL: API_BASE_URL,
@@ -8,8 +8,13 @@ const api = axios.create({
   headers: {
     'Content-Type': 'application/json',
   },
+  // 304 means our cached copy is still current (see etagCache)
+  validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
 });
 
+// Last response and ETag per GET URL, revalidated with If-None-Match
+const etagCache = new Map();
+
 // Request interceptor
 api.interceptors.request.use(
   async (config) => {
@@ -26,6 +31,12 @@ api.interceptors.request.use(
     } catch (err) {
       console.error('[API] Error getting token from storage:', err);
     }
+    if (config.method === 'get') {
+      const cached = etagCache.get(api.getUri(config));
+      if (cached) {
+        config.headers['If-None-Match'] = cached.etag;
+      }
+    }
     return config;
   },
   (error) => {
@@ -35,12 +46,51 @@ api.interceptors.request.use(
 
 // Response interceptor
 api.interceptors.response.use(
-  (response) => {
+  async (response) => {
     console.log('[API] Response:', response.status);
+    // Profile changes revoke our tokens and come with new ones
+    const accessToken = response.headers?.['x-access-token'];
+    if (accessToken) {
+      await AsyncStorage.setItem(storageKeys.TOKEN, accessToken);
+      await AsyncStorage.setItem(storageKeys.REFRESH_TOKEN, response.headers['x-refresh-token']);
+      api.defaults.headers.common['Authorization'] = `Bearer ${accessToken}`;
+    }
+    if (response.config.method === 'get') {
+      const key = api.getUri(response.config);
+      if (response.status === 304 && etagCache.has(key)) {
+        return { ...response, status: 200, data: etagCache.get(key).data };
+      }
+      const etag = response.headers?.etag;
+      if (etag) {
+        etagCache.set(key, { etag, data: response.data });
+      }
+    }
     return response;
   },
   async (error) => {
     console.log('[API] Error:', error.response?.status || 'network');
+    // Short-lived access tokens: renew once with the refresh token and retry
+    const original = error.config;
+    if (error.response?.status === 401 && original && !original._retried
+        && !original.url?.includes('/auth/')) {
+      original._retried = true;
+      try {
+        const refreshToken = await AsyncStorage.getItem(storageKeys.REFRESH_TOKEN);
+        if (refreshToken) {
+          const response = await api.post('/auth/refresh', { refresh_token: refreshToken });
+          const { access_token, refresh_token } = response.data;
+          await AsyncStorage.setItem(storageKeys.TOKEN, access_token);
+          if (refresh_token) {
+            await AsyncStorage.setItem(storageKeys.REFRESH_TOKEN, refresh_token);
+          }
+          api.defaults.headers.common['Authorization'] = `Bearer ${access_token}`;
+          original.headers.Authorization = `Bearer ${access_token}`;
+          return api(original);
+        }
+      } catch (refreshError) {
+        console.log('[API] Token refresh failed');
+      }
+    }
     // Don't automatically clear token on 401
     // Let AuthContext handle authentication state
     return Promise.reject(error);
@@ -87,6 +137,7 @@ export const tripsAPI = {
   getAll: (params) => api.get('/trips', { params }),
   getById: (id) => api.get(`/trips/${id}`),
   updateLocation: (id, location) => api.post(`/trips/${id}/location`, location),
+  updateLocations: (id, locations) => api.post(`/trips/${id}/locations`, locations),
   complete: (id, endLocation) => 
     api.put(`/trips/${id}/complete`, null, { params: endLocation }),
   setEmergency: (id) => api.put(`/trips/${id}/emergency`),
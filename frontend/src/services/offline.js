@@ -5,6 +5,9 @@ import { tripsAPI } from './api';
 // Queue for offline operations
 let operationQueue = [];
 
+// Max buffered locations sent per request (server accepts up to 1000)
+const LOCATION_BATCH_SIZE = 500;
+
 // Initialize offline service
 export const initializeOfflineService = async () => {
   try {
@@ -71,7 +74,7 @@ export const processQueue = async () => {
       return { success: true, processed: 0 };
     }
     
-    const results = [];
+    const results = await processLocationBatches();
     
     for (const operation of [...operationQueue]) {
       try {
@@ -79,8 +82,8 @@ export const processQueue = async () => {
         
         switch (operation.type) {
           case 'TRIP_LOCATION_UPDATE':
-            result = await tripsAPI.updateLocation(operation.tripId, operation.data);
-            break;
+            // Uploaded in batches by processLocationBatches
+            continue;
           // Add more operation types as needed
           default:
             console.warn('Unknown operation type:', operation.type);
@@ -121,6 +124,53 @@ export const processQueue = async () => {
   }
 };
 
+// Upload queued location updates in batches, one request per trip chunk
+const processLocationBatches = async () => {
+  const results = [];
+  const byTrip = {};
+
+  for (const operation of operationQueue) {
+    if (operation.type === 'TRIP_LOCATION_UPDATE') {
+      (byTrip[operation.tripId] = byTrip[operation.tripId] || []).push(operation);
+    }
+  }
+
+  for (const [tripId, operations] of Object.entries(byTrip)) {
+    for (let i = 0; i < operations.length; i += LOCATION_BATCH_SIZE) {
+      const chunk = operations.slice(i, i + LOCATION_BATCH_SIZE);
+      const chunkIds = new Set(chunk.map((op) => op.id));
+      // Keep the original fix time so the server can order and time the route
+      const locations = chunk.map((op) => ({
+        ...op.data,
+        timestamp: op.data.timestamp || op.timestamp,
+      }));
+
+      try {
+        const result = await tripsAPI.updateLocations(tripId, locations);
+        if (result.status === 200) {
+          operationQueue = operationQueue.filter((op) => !chunkIds.has(op.id));
+          chunk.forEach((op) => results.push({ success: true, id: op.id }));
+          continue;
+        }
+      } catch (error) {
+        // Fall through to retry accounting below
+      }
+
+      chunk.forEach((op) => {
+        op.retries += 1;
+      });
+      const expired = chunk.filter((op) => op.retries >= 3);
+      if (expired.length > 0) {
+        const expiredIds = new Set(expired.map((op) => op.id));
+        operationQueue = operationQueue.filter((op) => !expiredIds.has(op.id));
+        expired.forEach((op) => results.push({ success: false, id: op.id, error: 'Max retries exceeded' }));
+      }
+    }
+  }
+
+  return results;
+};
+
 // Get queue status
 export const getQueueStatus = async () => {
   return {
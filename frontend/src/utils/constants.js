@@ -172,6 +172,7 @@ export const tripStatus = {
 export const storageKeys = {
   USER: '@user',
   TOKEN: '@token',
+  REFRESH_TOKEN: '@refresh_token',
   VEHICLE_PREFERENCE: '@vehicle_preference',
   OFFLINE_QUEUE: '@offline_queue',
 };
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.config.settings import settings
+from app.routers.trips import check_location_times
+from app.schemas.pydantic_models import LocationPoint
+
+
+NOW = datetime(2026, 10, 16, 12, 0, 0)
+STARTED_AT = NOW - timedelta(minutes=30)
+
+
+def point(timestamp: datetime) -> LocationPoint:
+    return LocationPoint(latitude=4.6, longitude=-74.08, timestamp=timestamp)
+
+
+def test_accepts_points_between_start_and_now():
+    check_location_times([point(STARTED_AT), point(NOW)], STARTED_AT, now=NOW)
+
+
+def test_accepts_small_clock_skew():
+    skewed = NOW + timedelta(seconds=settings.LOCATION_MAX_CLOCK_SKEW_SECONDS)
+    check_location_times([point(skewed)], STARTED_AT, now=NOW)
+
+
+def test_rejects_future_timestamp():
+    future = NOW + timedelta(days=3650)
+    with pytest.raises(HTTPException) as error:
+        check_location_times([point(NOW), point(future)], STARTED_AT, now=NOW)
+    assert error.value.status_code == 422
+    assert "Location 1" in error.value.detail
+
+
+def test_rejects_timestamp_before_trip_start():
+    with pytest.raises(HTTPException) as error:
+        check_location_times([point(STARTED_AT - timedelta(seconds=1))], STARTED_AT, now=NOW)
+    assert error.value.status_code == 422